@@ -0,0 +1,154 @@
+"""
+Benchmark of the demographic (demo.Correlator) stage on synthetic projects.
+
+Generates projects with the columns the Correlator reads (School Poverty
+Level, Project Grade Level, School Metro Area, subjects, the charter / KIPP /
+NLNS / magnet / year-round flags), with trend keywords that take off at random
+points in time, and times each stage separately. Unless --no-memory, each
+stage also runs under tracemalloc and its peak allocation is reported
+(tracing slows the pure-Python parts somewhat).
+
+Run from the TrendFinder directory, e.g. the full sweep:
+
+    python benchmarks/bench_demo.py --rows 100000 1000000 5000000 --keywords 10 100
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import tracemalloc
+import warnings
+from contextlib import redirect_stdout
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib import demo
+from lib.feature_store import FeatureStore
+
+GRADE_LEVELS = ['Grades PreK-2', 'Grades 3-5', 'Grades 6-8', 'Grades 9-12']
+METRO_AREAS = ['urban', 'suburban', 'rural', 'town', None]
+POVERTY_LEVELS = ['low income', 'upper income']
+SUBJECT_CATEGORIES = {
+    'Math & Science': ['Mathematics', 'Applied Sciences', 'Environmental Science', 'Health & Life Science'],
+    'Literacy & Language': ['Literacy', 'Literature & Writing', 'ESL', 'Foreign Languages'],
+    'Music & The Arts': ['Music', 'Visual Arts', 'Performing Arts'],
+    'Applied Learning': ['Early Development', 'College & Career Prep', 'Character Education'],
+    'Health & Sports': ['Health & Wellness', 'Team Sports'],
+    'History & Civics': ['History & Geography', 'Social Sciences', 'Civics & Government'],
+    'Special Needs': ['Special Needs']
+}
+FLAGS = ['School Is Charter (Yes / No)', 'School Is KIPP (Yes / No)', 'School Is NLNS (Yes / No)',
+         'School Is Magnet (Yes / No)', 'School Is Year Round (Yes / No)']
+
+def make_projects(n_rows, start='2008-01-01', end='2018-05-15', seed=0):
+    """Synthetic projects frame, sorted by Project Posted Date, with the Correlator's columns."""
+    rng = np.random.RandomState(seed)
+    days = pd.date_range(start, end, freq='D')
+    # more projects in later years, as on the platform
+    weights = np.linspace(1, 4, len(days))
+    dates = days[np.sort(rng.choice(len(days), n_rows, p=weights / weights.sum()))]
+    categories = list(SUBJECT_CATEGORIES)
+    category = rng.randint(len(categories), size=n_rows)
+    subjects = [SUBJECT_CATEGORIES[name] for name in categories]
+    subject = [subjects[c][i % len(subjects[c])] for c, i in zip(category, rng.randint(12, size=n_rows))]
+    ids = ['{:016x}{:016x}'.format(a, b) for a, b in zip(rng.randint(2 ** 62, size=n_rows, dtype=np.int64),
+                                                         rng.randint(2 ** 62, size=n_rows, dtype=np.int64))]
+    df = pd.DataFrame({
+        'Project ID': ids,
+        'Project Posted Date': dates,
+        'Project Grade Level': pd.Categorical.from_codes(rng.randint(len(GRADE_LEVELS), size=n_rows), GRADE_LEVELS),
+        'School Metro Area': rng.choice(np.array(METRO_AREAS, dtype=object), n_rows, p=[.4, .3, .15, .1, .05]),
+        'School Poverty Level': rng.choice(POVERTY_LEVELS, n_rows, p=[.7, .3]),
+        'Project Subject': subject,
+        'Project Subject Category': np.array(categories)[category],
+    })
+    for flag, share in zip(FLAGS, [.1, .01, .02, .08, .05]):
+        df[flag] = np.where(rng.rand(n_rows) < share, 'Yes', 'No')
+    df['Project Grade Level'] = df['Project Grade Level'].astype(object)
+    return df
+
+def make_keywords(df, n_keywords, seed=0):
+    """{keyword: [project IDs]}: each keyword takes off at a random date and covers 0.1-2% of projects."""
+    rng = np.random.RandomState(seed + 1)
+    n_rows = len(df)
+    ids = df['Project ID'].values
+    keywords = {}
+    for i in range(n_keywords):
+        start = rng.randint(n_rows // 2)
+        size = rng.randint(n_rows // 1000, n_rows // 50 + 2)
+        keywords['keyword_{}'.format(i)] = list(ids[np.unique(rng.randint(start, n_rows, size=size))])
+    return keywords
+
+def measure(stage, results, memory, fn):
+    """Run fn, recording its time (and peak traced allocation) under stage."""
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        value = fn()
+    seconds = time.perf_counter() - start
+    peak = np.nan
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+    results.append({'stage': stage, 'seconds': seconds, 'peak_mb': peak})
+    return value
+
+def bench(n_rows, n_keywords, dense=False, store=False, processes=None, memory=True, seed=0):
+    """Stage timings (and peaks) of one Correlator run, as a frame."""
+    df = make_projects(n_rows, seed=seed)
+    keywords = make_keywords(df, n_keywords, seed=seed)
+    trends = list(keywords)
+    results = []
+    cor = measure('binarize', results, memory, lambda: demo.Correlator(
+        df, dense=dense, store=FeatureStore() if store else None))
+    measure('find_trends', results, memory, lambda: cor.find_trends(keywords_dict=keywords))
+    measure('get_categorical_trends', results, memory, lambda: cor.get_categorical_trends(trends, prop=False))
+    def stationarity():
+        cor.stationarize()
+        cor.stationarity_test_all(processes=processes)
+    measure('stationarity_test_all', results, memory, stationarity)
+    measure('compare_corrs', results, memory, cor.compare_corrs)
+    if dense:
+        features = cor.feature_names
+        measure('compare_ratios', results, memory,
+                lambda: [demo.compare_ratios(cor.df, cor.grouped, trend, features) for trend in trends])
+    else:
+        measure('compare_ratios', results, memory, lambda: [cor.compare_ratios(trend) for trend in trends])
+        measure('compare_all_ratios', results, memory, lambda: cor.compare_all_ratios(trends))
+    results = pd.DataFrame(results)
+    results.insert(0, 'keywords', n_keywords)
+    results.insert(0, 'rows', n_rows)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000])
+    parser.add_argument('--keywords', type=int, nargs='+', default=[10, 100])
+    parser.add_argument('--dense', action='store_true', help='benchmark Correlator(dense=True)')
+    parser.add_argument('--store', action='store_true', help='use a (fresh) FeatureStore')
+    parser.add_argument('--processes', type=int, default=None, help='stationarity test processes (serial by default, 0 for one per CPU)')
+    parser.add_argument('--no-memory', action='store_true', help='time without tracemalloc')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='also write the results to this CSV')
+    args = parser.parse_args(argv)
+
+    warnings.simplefilter('ignore')
+    all_results = []
+    for n_rows in args.rows:
+        for n_keywords in args.keywords:
+            results = bench(n_rows, n_keywords, dense=args.dense, store=args.store, processes=args.processes,
+                            memory=not args.no_memory, seed=args.seed)
+            print(results.to_string(index=False, float_format='{:.3f}'.format))
+            all_results.append(results)
+    all_results = pd.concat(all_results, ignore_index=True)
+    if args.output:
+        all_results.to_csv(args.output, index=False)
+    return all_results
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark of the import time of lib's modules.
+
+Each import runs in a fresh interpreter, --repeat times, and the fastest run
+is reported. 'lazy' is the plain import, as main.py pays for it: plotly,
+matplotlib, nltk and statsmodels are deferred (see lib/lazy.py) until a
+plot=True path or a stationarity test needs them. 'eager' also imports the
+dependencies each module used to load at import time, i.e. what every
+headless start cost before. The 'loaded' column lists which of those
+dependencies the plain import pulled in (none, normally).
+
+Run from the TrendFinder directory:
+
+    python benchmarks/bench_imports.py --repeat 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# lib module --> the dependencies it imported eagerly before they were deferred
+DEFERRED = {
+    'lib.plot_formatters': ['plotly.graph_objs'],
+    'lib.overview_traces': ['plotly.graph_objs', 'plotly.offline'],
+    'lib.stationarity': ['statsmodels.tsa.stattools'],
+    'lib.demo': ['plotly.graph_objs', 'plotly.offline', 'statsmodels.tsa.stattools'],
+    'lib.geo': ['plotly.graph_objs', 'plotly.offline'],
+    'lib.TrendFinder': ['plotly.offline', 'nltk.corpus'],
+}
+HEAVY = ['plotly', 'matplotlib', 'nltk', 'statsmodels']
+
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+for name in {extra!r}:
+    __import__(name)
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'loaded': sorted(name for name in {heavy!r} if name in sys.modules)}}))
+"""
+
+def time_import(module, extra=(), repeat=3):
+    """(fastest seconds, heavy packages loaded) of importing module (then extra) in a fresh interpreter."""
+    runs = []
+    for _ in range(repeat):
+        code = SCRIPT.format(module=module, extra=list(extra), heavy=HEAVY)
+        out = subprocess.run([sys.executable, '-W', 'ignore', '-c', code], cwd=ROOT, check=True,
+                             stdout=subprocess.PIPE, universal_newlines=True).stdout
+        runs.append(json.loads(out.strip().splitlines()[-1]))
+    fastest = min(runs, key=lambda run: run['seconds'])
+    return fastest['seconds'], fastest['loaded']
+
+def bench(modules, repeat=3, eager=True):
+    """Import times of modules, lazy (and eager), as a frame."""
+    results = []
+    for module in modules:
+        seconds, loaded = time_import(module, repeat=repeat)
+        results.append({'module': module, 'mode': 'lazy', 'seconds': seconds, 'loaded': ' '.join(loaded)})
+        if eager:
+            seconds, _ = time_import(module, DEFERRED.get(module, []), repeat=repeat)
+            results.append({'module': module, 'mode': 'eager', 'seconds': seconds, 'loaded': ''})
+    return pd.DataFrame(results, columns=['module', 'mode', 'seconds', 'loaded'])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--modules', nargs='+', default=list(DEFERRED))
+    parser.add_argument('--repeat', type=int, default=3, help='runs per import, the fastest is kept')
+    parser.add_argument('--no-eager', action='store_true', help='only time the plain imports')
+    parser.add_argument('--output', help='also write the results to this CSV')
+    args = parser.parse_args(argv)
+
+    results = bench(args.modules, repeat=args.repeat, eager=not args.no_eager)
+    print(results.to_string(index=False, float_format='{:.3f}'.format))
+    if args.output:
+        results.to_csv(args.output, index=False)
+    return results
+
+if __name__ == '__main__':
+    main()
@@ -6,21 +6,30 @@ import time
 import itertools
 import warnings
 from collections import defaultdict, Counter
+from functools import lru_cache
 
 import pandas as pd
 import numpy as np
-from nltk.corpus import stopwords
-import plotly
+import scipy.sparse as sp
 
 from lib import plot_formatters as pf
+from lib.features import FeatureMatrix, bin_sums
+from lib.helpers import time_bins
+from lib.lazy import lazy_import
+
+offline = lazy_import('plotly.offline')
 
-stoplist = stopwords.words("english")
-stoplist = stoplist + ['nan']
 translator = str.maketrans("", "", string.punctuation)
 
 date_col = "Project Posted Date"
 id_col = "Project ID"
 
+@lru_cache(maxsize=None)
+def get_stoplist():
+    """nltk's English stopwords plus 'nan', loaded on first use."""
+    from nltk.corpus import stopwords
+    return frozenset(stopwords.words("english") + ['nan'])
+
 def format_text(df, text_col):
     """Turning text into list of (unique) words."""
     print("Reducing strings to list of unique words...")
@@ -43,6 +52,53 @@ def get_freq_dict(df):
     print("Frequency dictionary built!")
     return freq_dict
 
+def word_matrix(cleaned):
+    """
+    Sparse (project x word) indicators of the word sets in cleaned, as a
+    FeatureMatrix whose columns are the vocabulary (in order of appearance).
+    """
+    lengths = np.fromiter((len(words) for words in cleaned), dtype=np.int64, count=len(cleaned))
+    codes, vocabulary = pd.factorize(list(itertools.chain.from_iterable(cleaned)))
+    indptr = np.concatenate([[0], np.cumsum(lengths)])
+    matrix = sp.csr_matrix((np.ones(len(codes), dtype=np.uint8), codes, indptr),
+                           shape=(len(lengths), len(vocabulary)))
+    return FeatureMatrix(matrix, vocabulary)
+
+def vocabulary_filter(vocabulary, remove_stopwords = True, min_length = 1, exclude = ()):
+    """
+    Boolean array over vocabulary (indexed by word id) of the words to keep:
+    not all digits, at least min_length characters, not in exclude and, if
+    remove_stopwords, not in get_stoplist().
+    """
+    vocabulary = pd.Index(vocabulary).astype(str)
+    keep = ~np.asarray(vocabulary.str.isdigit(), dtype=bool)
+    if min_length > 1:
+        keep &= np.asarray(vocabulary.str.len() >= min_length, dtype=bool)
+    if remove_stopwords:
+        keep &= ~vocabulary.isin(list(get_stoplist()))
+    if len(exclude):
+        keep &= ~vocabulary.isin(list(exclude))
+    return keep
+
+def top_positions(values, k, ties = None):
+    """
+    Positions of the k largest values, largest first, with ties in increasing
+    order of ties (positions by default). Only candidates that can make the top k,
+    found with argpartition, are sorted.
+    """
+    values = np.asarray(values)
+    ties = np.arange(len(values)) if ties is None else np.asarray(ties)
+    if k <= 0 or not len(values):
+        return np.array([], dtype=np.int64)
+    if k < len(values):
+        # everything tied with the k-th largest value is a candidate
+        kth = values[np.argpartition(-values, k - 1)[k - 1]]
+        candidates = np.flatnonzero(values >= kth)
+    else:
+        candidates = np.arange(len(values))
+    order = np.lexsort((ties[candidates], -values[candidates]))
+    return candidates[order[:k]]
+
 def subset_date_range(df, min_date, max_date):
     """Helper function to subset DataFrame by date."""
     df = df[(df[date_col] >= min_date) & (df[date_col] < max_date)]
@@ -83,29 +139,25 @@ class TrendFinder:
         # Clean
         self.df.dropna(axis=0, how="any", inplace=True)
         self.df = format_text(self.df, self.text_col)
+        self.words = None # word_matrix of self.df, see get_words
+        self.word_filters = {} # (remove_stopwords, min_length, exclude) --> vocabulary_filter of self.words
         print("Cleaning done!")
     
-    def find_historical_trends(self, filter_threshold = "", time_interval = "1M"):
+    def find_historical_trends(self, filter_threshold = "", time_interval = "1M", exclude = ()):
         """
         Find historical trends in DataFrame passed to TrendFinder (default
-        range is the ten years of 2008-2018).
+        range is the ten years of 2008-2018). Words in exclude are left out.
         """
         t0 = time.time()
         
         # Automatically set threshold at word needs to be present in 0.1% of
         # all projects in order to be considered relevant.
-        if len(filter_threshold) == 0:
+        if filter_threshold == "":
             filter_threshold = math.floor(.001 * len(self.df))
             
-        # Get words above the filter threshold
-        freq_dict = get_freq_dict(self.df)
-        words_left = [k for k, v in freq_dict.items() if v >= filter_threshold]
-        # Remove stopwords from consideration
-        words_left = [word for word in words_left if word not in stoplist]
-        # Remove numbers from considation
-        words_left = [word for word in words_left if word.isdigit() is False]
-        # Filter "words" that are 1 character
-        words_left = [word for word in words_left if len(word) > 1]
+        # Get words above the filter threshold, without stopwords, numbers,
+        # 1 character "words" and exclusions
+        words_left = list(self.get_words().columns[self.candidate_columns(filter_threshold = filter_threshold, exclude = exclude)])
         
         print("Total words: "+str(len(words_left)))
         print("")
@@ -157,28 +209,34 @@ class TrendFinder:
         print("Time elapsed: "+str((time.time() - t0) / 60)+" minutes.")
         return word_props
 
-    def find_current_trends(self, current_start = "", filter_threshold = "", days_back = 14, groups = 50, sd_multiple = 2):
+    def find_current_trends(self, current_start = "", filter_threshold = "", days_back = 14, groups = 50, sd_multiple = 2,
+                            exclude = (), top_k = None, dtype = np.float64):
         """
         Find trends in the present, returning a DataFrame sorting words by
         a weighted combination of overall relevance and current trendiness.
+        Words in exclude are left out. Only the top_k words are returned if
+        given, and proportions are accumulated in dtype (e.g. np.float32).
         """
         t0 = time.time()
         
         # Automatically set current period to be 2 weeks back from the last
         # date contained in the DataFrame
+        last_day = self.df[date_col].max()
         if len(current_start) == 0:
-            last_day = self.df[date_col].max()
             current_start = last_day - datetime.timedelta(days_back)
             current_start = current_start.date()
-        print("Looking at projects from "+str(current_start)+" to "+str(last_day.date())+".")
+        current_start = pd.Timestamp(current_start)
+        print("Looking at projects from "+str(current_start.date())+" to "+str(last_day.date())+".")
         
         # Save in case wanted for plots, etc.
         self.current_start = current_start.strftime("%Y-%m-%d")
         # Split into before and after
-        history = self.df[self.df[date_col] <= current_start]
-        current = self.df[self.df[date_col] > current_start]
+        is_current = (self.df[date_col] > current_start).values
+        history = self.df[~is_current]
+        current = self.df[is_current]
         # Save as class attribute for future use
         self.current = current
+        self.current_rows = np.flatnonzero(is_current)
         
         current_count = len(current) # Number of projects in current time frame
         print("There are "+str(current_count)+" projects in the current time frame.")
@@ -191,145 +249,161 @@ class TrendFinder:
         
         # Automatically set threshold at word needs to be present in 0.1% of
         # all projects in order to be considered relevant.
-        if len(filter_threshold) == 0:
+        if filter_threshold == "":
             # At an average at 10k projects per 2 weeks (2016 onwards), this effectives makes the minimum count ~50
             filter_threshold = math.floor(.005 * current_count)
 
-        # Get words above the filter threshold
-        freq_dict = get_freq_dict(current)
-        words_left = [k for k, v in freq_dict.items() if v >= filter_threshold]
-        # Remove stopwords from consideration
-        words_left = [word for word in words_left if word not in stoplist]
-        # Remove numbers from considation
-        words_left = [word for word in words_left if word.isdigit() is False]
-        # Filter "words" that are 1 character
-        words_left = [word for word in words_left if len(word) > 1]
+        # Get words above the filter threshold, without stopwords, numbers,
+        # 1 character "words" and exclusions
+        words_left = self.candidate_columns(self.current_rows, filter_threshold = filter_threshold, exclude = exclude)
         
         print("Total words: "+str(len(words_left)))
         print("")
 
         print("Creating groups for iteration...")
-        # Group DataFrame by day (want to go day-by-day backwards)
-        grouped = history.groupby(pd.Grouper(key=date_col, freq="D"))
+        # Bin history by day (want to go day-by-day backwards)
+        day_codes, days = time_bins(history[date_col], "D")
         # Reverse these arrays because we're going backwards in time
         # Get number of projects for each time frame (to divide later)
-        projects_xox = np.array(grouped.size().fillna(0).values, dtype=float)[::-1]
-        # Get DataFrame values for text column by time interval for faster iteration
-        list_by_time = convert_group_to_lists(grouped)[::-1]
+        projects_xox = np.bincount(day_codes[day_codes >= 0], minlength=len(days)).astype(float)[::-1]
 
         print("Building history...")
         # Go backwards in time, adding each day at a time until the period's count
         # is equal to or greater than the current time frame's number of projects
         history_index = 0 # Starting index of history data
-        history_groups = [] # Initialize list of lists for groups of texts
-        history_groups_index = 0 # To keep track of current group for while loop
-        history_groups_counts = [] # Initialize list of lists for number of projects in each group
+        day_groups = np.full(len(days), -1, dtype=np.int64) # Group of each (reversed) day, -1 if not used
+        history_groups_counts = [] # Number of projects in each group
 
         # Build history
-        while history_groups_index < groups:
-            # Add new group for new period of time in the past
-            history_groups.append([])
+        for history_groups_index in range(groups):
             # For number of projects in group
             group_count = 0
             # Add to group until it matches the count of the current period
             while group_count < current_count:
-                # Update list of lists of text
-                history_groups[history_groups_index].append(list_by_time[history_index])
+                day_groups[history_index] = history_groups_index
                 # Update group count
                 group_count += projects_xox[history_index]
                 # Next x from xox
                 history_index += 1
-            # Flatten group list
-            history_groups[history_groups_index] = list(itertools.chain.from_iterable(history_groups[history_groups_index]))
             # Add size of group to another list for later divison after group is done
             history_groups_counts.append(group_count)
-            # Next group
-            history_groups_index += 1
 
-        history_groups_counts = np.array(history_groups_counts)
+        history_groups_counts = np.array(history_groups_counts, dtype=dtype)
         
         # Get use history_groups_index as number of days to comprise history for printout
         print("Looking "+str(history_index)+" days back to test against current time frame.")
         print("")
-                               
-        # Create list of Counters for history
-        counter_list = []
-
-        for x in history_groups:
-            counter = Counter(x)
-            counter = {word: counter[word] for word in words_left}
-            counter_list.append(counter)
-
-        # Combine dictionaries to get list of counts by time frame per word
-        all_counts_dict = defaultdict(list)
-
-        for d in counter_list:
-            for k, v in d.items():
-                all_counts_dict[k].append(v)
 
-        # Divide by projects_xox to get proportion over time
-        all_props_dict = {k: (v / history_groups_counts) for k, v in all_counts_dict.items()}
+        # Group of every project (current projects and older history are skipped)
+        codes = np.full(len(self.df), -1, dtype=np.int64)
+        codes[~is_current] = day_groups[len(days) - 1 - day_codes]
+        
+        # Counts of every candidate word per group, as proportions over time
+        candidates = self.get_words().matrix[:, words_left]
+        props = bin_sums(codes, groups, candidates).astype(dtype) / history_groups_counts[:, None]
 
         # Find mean, standard deviation of props for each word
-        mean_sd_dict = {}
-
-        for word in words_left:
-            props = all_props_dict[word]
-            mean_sd_dict[word] = (props.mean(), props.std())
+        means = props.mean(axis=0)
+        sds = props.std(axis=0)
 
         # Calculate proportion in current period
-        current_text = list(itertools.chain.from_iterable(current["cleaned"].tolist()))
-        current_counter = Counter(current_text)
-
-        current_props_dict = {word: current_counter[word] / current_count for word in words_left}
+        current_counts = np.bincount(candidates[self.current_rows].indices, minlength=len(words_left))
+        current_props = current_counts.astype(dtype) / current_count
 
         # Find deviation from mean in current period
-        deviation_dict = {word: abs(current_props_dict[word] - mean_sd_dict[word][0]) for word in words_left}
-        
-        # Return sorted DataFrame of outliers
-        rows = []
-
-        for word in words_left:
-            # Define outlier based on mean + number of SDs
-            if deviation_dict[word] > sd_multiple * mean_sd_dict[word][1]:
-                rows.append((word, current_props_dict[word], mean_sd_dict[word][0], mean_sd_dict[word][1], deviation_dict[word]))
+        deviations = np.abs(current_props - means)
+        # Define outlier based on mean + number of SDs
+        outliers = np.flatnonzero(deviations > sd_multiple * sds)
 
-        # Create DataFrame and sort by ratio difference of current deviation
+        # Sort by ratio difference of current deviation
         # (i.e. how many times larger is the current deviation)
-        outlier_df = pd.DataFrame(rows, columns = ["word", "prop", "historical_mean", "historical_sd", "deviation"])
-        # outlier_df["sd_difference"] = outlier_df["deviation"] - outlier_df["historical_sd"]
-        outlier_df["sd_difference_ratio"] = outlier_df["deviation"] / outlier_df["historical_sd"]
+        with np.errstate(divide="ignore"):
+            sd_difference_ratios = deviations[outliers] / sds[outliers]
         # Weighting scheme for sorting...
         # Current mean (i.e. how big it is, for relevance) * SD difference ratio (i.e. how abnormal is this right now)
-        outlier_df["weight"] = outlier_df["prop"] * outlier_df["sd_difference_ratio"]
-        outlier_df = outlier_df.sort_values("weight", ascending=False).reset_index(drop=True).reset_index().rename(columns={"index":"Rank"})
-        # (Add 1 to index to start at 1)
-        outlier_df["Rank"] = outlier_df["Rank"] + 1
+        weights = current_props[outliers] * sd_difference_ratios
+        # Only the top_k weights are sorted
+        top = top_positions(weights, len(outliers) if top_k is None else top_k)
+        chosen = outliers[top]
 
-        print(str(len(rows)) + " keywords deviate more than 2 SDs above their normal mean.")
+        # Return sorted DataFrame of outliers
+        outlier_df = pd.DataFrame({"word": self.get_words().columns[words_left[chosen]],
+                                   "prop": current_props[chosen],
+                                   "historical_mean": means[chosen],
+                                   "historical_sd": sds[chosen],
+                                   "deviation": deviations[chosen],
+                                   "sd_difference_ratio": sd_difference_ratios[top],
+                                   "weight": weights[top]})
+        # (Start at 1)
+        outlier_df.insert(0, "Rank", np.arange(1, len(outlier_df) + 1))
+
+        print(str(len(outliers)) + " keywords deviate more than 2 SDs above their normal mean.")
         print("")
 
         print("Time elapsed: "+str((time.time() - t0) / 60)+" minutes.")
         return outlier_df
 
+    def get_words(self):
+        """word_matrix of the projects in self.df (built on first use)."""
+        if self.words is None:
+            self.words = word_matrix(self.df["cleaned"].tolist())
+        return self.words
+
+    def get_word_filter(self, remove_stopwords = True, min_length = 1, exclude = ()):
+        """vocabulary_filter of get_words' vocabulary (computed once per setting)."""
+        key = (remove_stopwords, min_length, frozenset(exclude))
+        if key not in self.word_filters:
+            self.word_filters[key] = vocabulary_filter(self.get_words().columns, remove_stopwords = remove_stopwords,
+                                                       min_length = min_length, exclude = exclude)
+        return self.word_filters[key]
+
+    def candidate_columns(self, rows = None, filter_threshold = 0, exclude = ()):
+        """
+        Word ids of the words in at least filter_threshold of the projects at
+        positions rows (all if None), without stopwords, digits, 1-character
+        words and the words in exclude: one mask over the vocabulary's project counts.
+        """
+        matrix = self.get_words().matrix
+        if rows is not None:
+            matrix = matrix[rows]
+        freqs = np.bincount(matrix.indices, minlength=matrix.shape[1])
+        keep = self.get_word_filter(min_length = 2, exclude = exclude)
+        return np.flatnonzero((freqs >= filter_threshold) & (freqs > 0) & keep)
+
     def plot_xox(self, word, time_interval = "1M", prop = True, plot = True):
         """Simple plotter function for seeing change in word over time."""
-        # Get total number of projects per time period
-        projects_xox = self.df.groupby(pd.Grouper(key=date_col, freq=time_interval)).size()
-        # Get subset of word to operate on
-        word_subset = self.df[self.df["cleaned"].apply(lambda x: word in x)]
-        word_xox = word_subset.groupby(pd.Grouper(key=date_col, freq=time_interval)).size()
-
-        to_plot = pd.DataFrame()
-        to_plot['prop'] = word_xox / projects_xox
-        to_plot['counts'] = word_xox
-
-        plot_config = {'kwargs': {'prop': prop}, 'df': to_plot}
+        plot_config = self.plot_xox_many([word], time_interval = time_interval, prop = prop)[word]
         if not plot:
             return plot_config
+        to_plot = plot_config['df']
 
         fig = pf.plot_xox(df=to_plot, trend=word, prop=prop)
-        plotly.offline.iplot(fig, filename='xox')
+        offline.iplot(fig, filename='xox')
+
+    def plot_xox_many(self, words, time_interval = "1M", prop = True):
+        """
+        plot_xox configs (plot = False) of every word in words, as {word: config}.
+        Projects per period are counted once, and every word's counts come from
+        one sparse product of the period codes with get_words.
+        """
+        codes, periods = time_bins(self.df[date_col], time_interval)
+        projects_xox = np.bincount(codes[codes >= 0], minlength=len(periods))
+        counts = bin_sums(codes, len(periods), self.get_words().reindex(list(words)).matrix).astype(np.int64)
+        configs = {}
+        for i, word in enumerate(words):
+            word_xox = pd.Series(counts[:, i], index=periods)
+            # the word's own groupby only spans the periods from its first to its last project
+            found = np.flatnonzero(counts[:, i])
+            if len(found) < len(periods):
+                span = np.zeros(len(periods), dtype=bool)
+                if len(found):
+                    span[found[0]:found[-1] + 1] = True
+                word_xox = word_xox.where(span)
+            to_plot = pd.DataFrame(index=periods)
+            to_plot['prop'] = word_xox / projects_xox
+            to_plot['counts'] = word_xox
+            configs[word] = {'kwargs': {'prop': prop}, 'df': to_plot}
+        return configs
             
     def subset_resources_by_query(self, query, current = False):
         """
@@ -346,12 +420,34 @@ class TrendFinder:
         
     def find_co_occurrences(self, query, top_n = 10, remove_stopwords = True, current = True):
         """Get top co-occurring words with a query from resources."""
-        subset = self.subset_resources_by_query(query, current = current)
-        flattened_resources = itertools.chain.from_iterable(subset["cleaned"].tolist())
-        counter = Counter(flattened_resources)
-        # Remove numbers
-        counter = Counter({word: counter[word] for word in counter.keys() if not word.isdigit()})
-        if remove_stopwords:
-            counter = Counter({word: counter[word] for word in counter.keys() if word not in stoplist})
-        
-        return counter.most_common(top_n)
+        return self.find_co_occurrences_many([query], top_n = top_n, remove_stopwords = remove_stopwords,
+                                             current = current)[query]
+
+    def find_co_occurrences_many(self, queries, top_n = 10, remove_stopwords = True, current = True):
+        """
+        Top co-occurring words of every query, as {query: [(word, count), ...]}.
+
+        The (query x word) counts of all queries are one sparse product, of the
+        queries' columns of the word matrix (restricted to the current rows if
+        current) with the word matrix itself. Digits and stopwords are dropped
+        through get_word_filter, and each query's top_n are picked with
+        argpartition. Ties are listed in order of first appearance in the resources.
+        """
+        words = self.get_words()
+        matrix = words.matrix[self.current_rows] if current else words.matrix
+        matrix = matrix.astype(np.int32)
+        queries = list(queries)
+        columns = words.columns.get_indexer(queries)
+        found = np.flatnonzero(columns >= 0)
+        counts = matrix[:, columns[found]].T.tocsr().dot(matrix).tocsr()
+        keep = self.get_word_filter(remove_stopwords = remove_stopwords)
+        co_occurrences = {query: [] for query in queries}
+        for row, i in enumerate(found):
+            ids = counts.indices[counts.indptr[row]:counts.indptr[row + 1]]
+            values = counts.data[counts.indptr[row]:counts.indptr[row + 1]]
+            kept = keep[ids] & (values > 0)
+            ids, values = ids[kept], values[kept]
+            top = top_positions(values, top_n, ties = ids)
+            co_occurrences[queries[i]] = [(words.columns[j], int(count)) for j, count in zip(ids[top], values[top])]
+
+        return co_occurrences
@@ -4,6 +4,7 @@ import json
 from datetime import date
 from datetime import datetime as dt
 import io
+import os
 
 from flask import Flask
 import pandas as pd
@@ -18,6 +19,13 @@ import plot_formatters as pf
 
 app = dash.Dash(__name__)
 application = app.server
+
+# Gzip responses (figures, callbacks) when the browser accepts it; set the
+# COMPRESS_RESPONSES environment variable to 0 to turn it off
+COMPRESS_RESPONSES = os.environ.get("COMPRESS_RESPONSES", "1") != "0"
+if COMPRESS_RESPONSES:
+    from flask_compress import Compress
+    Compress(application)
 app.css.append_css({"external_url": "https://codepen.io/chriddyp/pen/bWLwgP.css"})
 app.css.append_css({"external_url": "https://codepen.io/anon/pen/gzXjjB.css"})
 app.css.append_css({"external_url": "https://codepen.io/anon/pen/QraBjB.css"})
@@ -31,6 +39,11 @@ bucket = "donorschoose-trends"
 DATES = []
 PLOT_DATA = {}
 
+# Draw split and feature plots with only the selected split/feature's traces,
+# switched by the dashboard's dropdowns instead of embedding all of them
+COMPACT_FIGURES = True
+COMPACT_PLOTS = ['plot_splits', 'plot_cumulative_splits', 'plot_rolling_splits', 'plot_trend_features']
+
 # directory structure:
 
 # donorschoose-trends/ (bucket)
@@ -180,17 +193,20 @@ def overview_toggle(elem_id):
         # labelStyle={'display': 'inline-block'}
     )
 
+# calendar window --> number of 2-week bins it used to be saved under
+LEGACY_WINDOWS = {"1M": 2, "3M": 6, "6M": 13, "1Y": 26}
+
 def window_toggle(elem_id):
 	options = [
-        {"value":2, "label": "1 month"},
-        {"value":6, "label": "3 months"},
-        {"value":13, "label": "6 months"},
-        {"value":26, "label": "1 year"}
+        {"value":"1M", "label": "1 month"},
+        {"value":"3M", "label": "3 months"},
+        {"value":"6M", "label": "6 months"},
+        {"value":"1Y", "label": "1 year"}
     ]
 	return dcc.RadioItems(
         id=elem_id,
         options=options,
-        value=6,
+        value="3M",
         labelStyle={'display': 'inline-block', 'padding-right':5, 'font-family':'Futura'}
     )
 
@@ -201,6 +217,8 @@ def generate_plot(date, trend, plot_name, **kwargs):
             df = PLOT_DATA[date][trend][plot_name]['data']
             plotter = getattr(pf, plot_name)
             kwargs = {**kwargs, **plot_kwargs}
+            if plot_name in COMPACT_PLOTS:
+                kwargs['compact'] = kwargs.get('compact', False) or COMPACT_FIGURES
             fig = plotter(df, trend, **kwargs)
             
             return dcc.Graph(
@@ -367,6 +385,9 @@ app.layout = html.Div(children=[
         
         html.Div([
             # html.Label('Plot trend features'),
+            html.Label('Choose feature:'),
+            html.Div(id='trend-features', children=[
+                generate_dropdown(pd.DataFrame(), elem_id='feature-dropdown', col='feature')]),
             html.Div(id='plot-trend-features')
         ], className='nine columns')
     ]),
@@ -437,14 +458,28 @@ def plot_xox(date, trend):
 	return generate_plot(date, trend, plot_name)
 	
 
+@app.callback(
+    Output(component_id='trend-features', component_property='children'),
+    [Input(component_id='date-dropdown', component_property='value'),
+     Input(component_id='trend-dropdown', component_property='value')]
+)
+def trend_features(date, trend):
+    # features of the trend's plot_trend_features, from its kwargs alone
+    features = []
+    if trend in PLOT_DATA[date] and 'plot_trend_features' in PLOT_DATA[date][trend]:
+        features = pf.compact_index(PLOT_DATA[date][trend]['plot_trend_features']['kwargs'])
+    features_df = pd.DataFrame({'feature': ['None'] + features})
+    return generate_dropdown(features_df, elem_id='feature-dropdown', col='feature')
+
 @app.callback(
 	Output(component_id='plot-trend-features', component_property='children'),
 	[Input(component_id='date-dropdown', component_property='value'),
-     Input(component_id='trend-dropdown', component_property='value')]
+     Input(component_id='trend-dropdown', component_property='value'),
+     Input(component_id='feature-dropdown', component_property='value')]
 )
-def plot_trend_features(date, trend):
+def plot_trend_features(date, trend, feature):
 	plot_name = 'plot_trend_features'
-	return generate_plot(date, trend, plot_name)
+	return generate_plot(date, trend, plot_name, feature=feature)
 
 @app.callback(
 	Output(component_id='top-corrs', component_property='children'),
@@ -571,10 +606,14 @@ def plot_cumulative_splits(date, trend, split):
 def plot_rolling_splits(date, trend, window, split):
     plot_name_base = 'plot_rolling_splits'
     plot_name = '{}_{}'.format(plot_name_base, window)
+    if trend in PLOT_DATA[date] and plot_name not in PLOT_DATA[date][trend]:
+        # dates written before windows were calendar units are keyed by 2-week bin counts
+        plot_name = '{}_{}'.format(plot_name_base, LEGACY_WINDOWS[window])
     if trend in PLOT_DATA[date]:
         if plot_name in PLOT_DATA[date][trend]:
             kwargs = PLOT_DATA[date][trend][plot_name]['kwargs']
             kwargs['solo_split'] = split
+            kwargs['compact'] = kwargs.get('compact', False) or COMPACT_FIGURES
             df = PLOT_DATA[date][trend][plot_name]['data']
             plotter = getattr(pf, plot_name_base)
             fig = plotter(df, trend, **kwargs)
@@ -1,24 +1,55 @@
 import re
+import tracemalloc
+from collections import OrderedDict
 
 import pandas as pd
 import numpy as np
-
-import plotly
-import plotly.graph_objs as go
-from statsmodels.tsa.stattools import adfuller
-from pytrends.request import TrendReq
+import scipy.sparse as sp
 
 from lib import plot_formatters as pf
+from lib.lazy import lazy_import
+from lib.google_trends import PytrendsProvider
+from lib.features import project_fields, encode_features, bin_sums, keyword_matrix_from_ids, keyword_matrix_from_text
+from lib.helpers import time_bins, rolling_sums
+from lib.stationarity import stationarity_table, adf_result, RESULT_COLUMNS, MAX_P_VALUE
+
+offline = lazy_import('plotly.offline')
+plt = lazy_import('matplotlib.pyplot')
 
 class Correlator(object):
-    def __init__(self, df, start_date="2008-01-01", end_date="2019-01-01"):
-        self.df = df
+    def __init__(self, df, start_date="2008-01-01", end_date="2019-01-01", dense=False, store=None):
+        """
+        With dense=False (default) features are kept in a sparse FeatureMatrix
+        (self.features) instead of Bin_* columns added to df; dense=True keeps
+        the original column-based behaviour.
+
+        Given a FeatureStore, the monthly feature series and their stationarity
+        results come from the store (brought up to date with df) and features
+        are only encoded for the projects in a trend, when needed.
+
+        Unless dense, df is not modified: self.df is a new frame of only the
+        date and feature fields, as categoricals, indexed by Project ID.
+        """
+        self.dense = dense
+        if dense:
+            self.df = df
+        else:
+            self.source = df
+            self.df = project_fields(df)
+            self.positions = np.arange(len(df)) # row in source of each row of self.df
+        self.store = None if dense else store
+        self.bins = {} # time_interval --> (bin code per row, bin labels)
+        self.days = None # (day code per row, days, projects per day)
+        self.cube = {} # 'features' / 'trends' --> (day x column) counts
+        self.period_bins = {} # time_interval --> (bin code per day, bin labels)
+        self.trends = None
         self.clean(start_date=start_date, end_date=end_date)
         self.binarize()
 
     def clean(self, start_date="2008-01-01", end_date="2018-01-01"):
         self.date = "Project Posted Date"
-        self.df.index = self.df['Project ID']
+        if self.dense:
+            self.df.index = self.df['Project ID']
         # Already subsetting by date beforehand
         # self.df[self.date] = pd.to_datetime(self.df[self.date])
         # self.df = self.df[self.df[self.date] >= start_date]
@@ -37,7 +68,35 @@ class Correlator(object):
 
         The second way is to pass a list_of_keywords. This will find the trends
         within this class - useful if you don't want to rely on TrendFinder.
+
+        Unless dense, the indicators go into a sparse (project x keyword) matrix,
+        self.trends, instead of df columns: IDs are mapped to rows with one
+        get_indexer call, and list_of_keywords are matched (as literal strings)
+        in a single scan of the field.
         """
+        if not self.dense:
+            if list_of_keywords:
+                texts = self.source[field].values[self.positions]
+                keep = pd.notnull(texts)
+                if not keep.all():
+                    self.df = self.df[keep]
+                    self.positions = self.positions[keep]
+                    texts = texts[keep]
+                    # keep the other row-aligned structures in step with df
+                    if self.features is not None:
+                        self.features = self.features.take(keep)
+                    else:
+                        # the store's series cover all projects, not this subset
+                        self.features = encode_features(self.df)
+                    if self.trends is not None:
+                        self.trends = self.trends.take(keep)
+                    self.bins, self.days, self.cube = {}, None, {}
+                trends = keyword_matrix_from_text(texts.tolist(), list_of_keywords)
+            else:
+                trends = keyword_matrix_from_ids(self.df.index, keywords_dict)
+            self.trends = trends if self.trends is None else self.trends.join(trends)
+            self.cube.pop('trends', None)
+            return
         if list_of_keywords:
             self.df = self.df.dropna(subset=[field])
             for kw in list_of_keywords:
@@ -115,7 +174,15 @@ class Correlator(object):
     def binarize(self):
         """
         Calls the 2 binarizing functions above, for each feature in projects dataset.
+        Unless dense, encodes the same features into self.features in one pass instead.
         """
+        if self.store is not None:
+            self.store.update(self.df)
+            self.features = None
+            return
+        if not self.dense:
+            self.features = encode_features(self.df)
+            return
         list_of_categorical_fields = ['Project Grade Level', 'School Metro Area', 'Project Subject', 'Project Subject Category']
 
         for field in list_of_categorical_fields:
@@ -124,6 +191,37 @@ class Correlator(object):
         self.df = self.custom_binarize_fields()
         self.df = self.df.drop(columns=['Bin_Project Grade Level(n/a)', 'Bin_School Metro Area(n/a)'], errors='ignore')
 
+    @property
+    def feature_names(self):
+        """Names of the Bin_* features, whether dense columns or in self.features."""
+        if self.dense:
+            return [col for col in self.df.columns if 'Bin' in col]
+        if self.features is None:
+            return self.store.feature_names
+        return self.features.bin_columns
+
+    def memory_report(self):
+        """
+        Megabytes held by each of the Correlator's structures, and the peak
+        traced so far if tracemalloc is tracing.
+        """
+        sizes = OrderedDict([('df', self.df.memory_usage(deep=True).sum())])
+        for name in ['features', 'trends']:
+            matrix = getattr(self, name)
+            if matrix is not None:
+                sizes[name] = matrix.matrix.data.nbytes + matrix.matrix.indices.nbytes + matrix.matrix.indptr.nbytes
+        sizes['time bins'] = sum(codes.nbytes for codes, _ in self.bins.values())
+        for name in ['grouped', 'diff_grouped']:
+            if hasattr(self, name):
+                sizes[name] = getattr(self, name).memory_usage(deep=True).sum()
+        if tracemalloc.is_tracing():
+            sizes['peak (tracemalloc)'] = tracemalloc.get_traced_memory()[1]
+        return pd.Series(sizes) / 1e6
+
+    def uses_store(self, time_interval):
+        """Whether feature series at time_interval come from self.store."""
+        return self.store is not None and self.features is None and time_interval == self.store.time_interval
+
     def desired_trend(self, desired_col, time_interval="1Y", prop=True, thres=0):
         """
         Currently not used, see get_categorical_trends instead
@@ -151,6 +249,13 @@ class Correlator(object):
         Creates grouped df from original df, based on time grouper
         """
         print('Computing trends')
+        self.time_interval, self.prop = time_interval, prop
+        if not self.dense:
+            sums, sizes = self.period_counts(desired_cols, time_interval)
+            grouped = sums / sizes if prop else sums
+            self.grouped = grouped
+            print('Done!')
+            return grouped
         bin_cols = [col for col in self.df.columns if 'Bin' in col]
         # ord_cols = [col for col in self.df.columns if 'Ord' in col]
         if prop:
@@ -163,10 +268,168 @@ class Correlator(object):
         print('Done!')
         return grouped
     
+    def rolling_trends(self, desired_cols, window, time_interval='1m', prop=False):
+        """
+        Like get_categorical_trends, but each period covers the window periods
+        up to it (NaN before the first full window): rolling sums, or rolling
+        proportions if prop. Derived from cumulative sums of the period counts.
+        """
+        sums, sizes = self.period_counts(desired_cols, time_interval)
+        values = rolling_sums(sums.values, window)
+        if prop:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                values = values / rolling_sums(sizes, window)
+        return pd.DataFrame(values, index=sums.index, columns=sums.columns)
+
+    def get_days(self):
+        """Day of every project (as days since the first), the days, and the projects per day."""
+        if self.days is None:
+            dates = pd.DatetimeIndex(self.df[self.date]).normalize()
+            valid = ~dates.isna()
+            days = pd.date_range(dates[valid].min(), dates[valid].max(), freq='D')
+            codes = np.full(len(dates), -1, dtype=np.int64)
+            codes[valid] = (dates[valid] - days[0]).days
+            self.days = (codes, days, np.bincount(codes[valid], minlength=len(days)))
+        return self.days
+
+    def daily_counts(self, name):
+        """
+        (day x column) counts of the Bin_* features (name='features') or the
+        trends (name='trends'): the daily cube other time intervals are
+        aggregated from. Computed once.
+        """
+        if name not in self.cube:
+            codes, days, _ = self.get_days()
+            matrix = self.row_features() if name == 'features' else self.trends
+            self.cube[name] = pd.DataFrame(bin_sums(codes, len(days), matrix.matrix).astype(np.int64),
+                                           index=days, columns=matrix.columns)
+        return self.cube[name]
+
+    def period_counts(self, desired_cols, time_interval='1m'):
+        """
+        Sums of the desired_cols trends and the Bin_* features per time_interval
+        (a frame) and the projects to divide them by (an array of one column, or
+        one per column when the features come from the store: those are over
+        the store's projects), aggregated from the daily cube instead of
+        regrouping the projects.
+        """
+        _, days, day_sizes = self.get_days()
+        store = self.uses_store(time_interval)
+        if time_interval not in self.period_bins:
+            if store:
+                # aligned with the store's months
+                self.period_bins[time_interval] = (self.store.bin_codes(days), self.store.index)
+            else:
+                self.period_bins[time_interval] = time_bins(days, time_interval)
+        codes, index = self.period_bins[time_interval]
+        valid = codes >= 0
+        trends = bin_sums(codes, len(index), self.daily_counts('trends')[desired_cols].values)
+        sizes = np.bincount(codes[valid], weights=day_sizes[valid], minlength=len(index)).astype(np.int64)[:, None]
+        if store:
+            features = self.store.grouped().values
+            store_sizes = pd.concat([self.store.sizes, self.store.current[1]]).values
+            sizes = np.hstack([np.repeat(sizes, len(desired_cols), axis=1),
+                               np.repeat(store_sizes[:, None], features.shape[1], axis=1)])
+        else:
+            features = bin_sums(codes, len(index), self.daily_counts('features')[self.feature_names].values)
+        sums = pd.DataFrame(np.hstack([trends, features]).astype(np.int64), index=index,
+                            columns=list(desired_cols) + self.feature_names)
+        sums.index.name = self.date
+        return sums, sizes
+
+    def get_time_bins(self, time_interval='1m'):
+        """Bin code of every project's date and the bin labels, computed once per time_interval."""
+        if time_interval not in self.bins:
+            if self.uses_store(time_interval):
+                # aligned with the store's months
+                self.bins[time_interval] = (self.store.bin_codes(self.df[self.date]), self.store.index)
+            else:
+                self.bins[time_interval] = time_bins(self.df[self.date], time_interval)
+        return self.bins[time_interval]
+
+    def grouped_features(self, time_interval='1m', prop=False, rows=None):
+        """
+        Bin_* feature sums (or means, if prop) per time_interval, from self.features.
+        Optionally only over the given row mask.
+        """
+        if rows is None and self.uses_store(time_interval):
+            return self.store.grouped(prop)
+        return self.grouped_matrix(self.row_features(rows), time_interval, prop, rows)
+
+    def row_features(self, rows=None):
+        """FeatureMatrix of the Bin_* features of the rows in the mask (all rows if None)."""
+        if self.features is None:
+            df = self.df if rows is None else self.df[rows]
+            return encode_features(df).reindex(self.feature_names)
+        features = self.features.select(self.feature_names)
+        return features if rows is None else features.take(rows)
+
+    def grouped_matrix(self, features, time_interval='1m', prop=False, rows=None):
+        """
+        Column sums (or means, if prop) of a FeatureMatrix per time_interval.
+        Its rows are those of self.df, or those in the rows mask if given.
+        """
+        codes, index = self.get_time_bins(time_interval)
+        if rows is not None:
+            codes = codes[rows]
+        sums = bin_sums(codes, len(index), features.matrix)
+        if prop:
+            sizes = np.bincount(codes[codes >= 0], minlength=len(index))
+            with np.errstate(invalid='ignore', divide='ignore'):
+                values = sums / sizes[:, None]
+        else:
+            values = sums.astype(np.int64)
+        grouped = pd.DataFrame(values, index=index, columns=features.columns)
+        grouped.index.name = self.date
+        return grouped
+
+    def compare_ratios(self, trend, features=None, time_interval="1m"):
+        """
+        Same as compare_ratios below, but from self.features: the difference
+        between each feature's ratio within trend projects and among all projects.
+        """
+        if features is None:
+            features = self.feature_names
+        in_trend = self.trends.column(trend) == 1
+        trend_ratios = self.grouped_features(time_interval, prop=True, rows=in_trend)[features]
+        gen_ratios = self.grouped_features(time_interval, prop=True)[features]
+        return trend_ratios - gen_ratios
+
+    def compare_all_ratios(self, trends=None, features=None, time_interval="1m"):
+        """
+        compare_ratios for every trend (all of self.trends by default) in one pass:
+        a dict of trend --> diffs frame. The (month x trend) x feature sums come
+        from a single sparse product, and the all-projects ratios are computed once.
+        """
+        if trends is None:
+            trends = list(self.trends.columns)
+        if features is None:
+            features = self.feature_names
+        gen_ratios = self.grouped_features(time_interval, prop=True)[features]
+        codes, index = self.get_time_bins(time_interval)
+        trend_matrix = self.trends.select(trends).matrix
+        rows = np.asarray(trend_matrix.sum(axis=1)).ravel() > 0
+        feature_matrix = self.row_features(rows).select(features).matrix
+        # one grouping row per (month, trend), over the rows in any trend
+        membership = trend_matrix[rows].tocoo()
+        month = codes[rows][membership.row]
+        valid = month >= 0
+        groups = month[valid] * len(trends) + membership.col[valid]
+        grouping = sp.csr_matrix((np.ones(len(groups)), (groups, membership.row[valid])),
+                                 shape=(len(index) * len(trends), feature_matrix.shape[0]))
+        sums = grouping.dot(feature_matrix).toarray().reshape(len(index), len(trends), len(features))
+        sizes = np.bincount(groups, minlength=len(index) * len(trends)).reshape(len(index), len(trends))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ratios = sums / sizes[:, :, None]
+        diffs = ratios - gen_ratios.values[:, None, :]
+        return {trend: pd.DataFrame(diffs[:, i, :], index=gen_ratios.index, columns=features)
+                for i, trend in enumerate(trends)}
+
     def stationarize(self, yearly_seasonality=None):
         """
         Stationarizes grouped df. Takes first differences, and removes yearly seasonality if param is passed
         """
+        self.yearly_seasonality = yearly_seasonality
         diff_grouped = pd.DataFrame()
         for col in self.grouped.columns:
         #     diff_grouped[col] = np.log(grouped[col].dropna())
@@ -175,18 +438,27 @@ class Correlator(object):
                 diff_grouped[col] = diff_grouped[col].diff(yearly_seasonality)
         self.diff_grouped = diff_grouped
 
-    def stationarity_test_all(self):
+    def stationarity_test_all(self, critical_val=5, processes=None):
         """
-        Tests stationarity for all grouped features/trends, and retains only those that passed. 
+        Tests stationarity for all grouped features/trends, and retains only those that passed.
+        The tests run serially unless processes is given (see stationarity.run_adf),
+        feature results are cached between calls, and the full results are kept in
+        self.stationarity (one row per column).
         """
-        passed_cols = []
-        for col in self.diff_grouped.columns:
-            print(col)
-            res = test_stationarity(self.diff_grouped[col].fillna(0))
-            if res=='Passed':
-                passed_cols.append(col)
-            else:
-                print('\t' + res)
+        features = [col for col in self.diff_grouped.columns if 'Bin' in col]
+        if self.uses_store(getattr(self, 'time_interval', None)):
+            # feature results as of the last complete month
+            stored = self.store.feature_stationarity(self.prop, self.yearly_seasonality, critical_val, processes)
+            trends = [col for col in self.diff_grouped.columns if col not in features]
+            tested = stationarity_table(self.diff_grouped[trends], critical_val=critical_val,
+                                        processes=processes, cache_columns=[])
+            stationarity = pd.concat([tested, stored]).reindex(self.diff_grouped.columns)
+            stationarity['Passed'] = stationarity['Passed'].fillna(False).astype(bool)
+            self.stationarity = stationarity
+        else:
+            self.stationarity = stationarity_table(self.diff_grouped, critical_val=critical_val,
+                                                   processes=processes, cache_columns=features)
+        passed_cols = list(self.stationarity.index[self.stationarity['Passed']])
 
         self.passed_trends = [col for col in passed_cols if 'Bin' not in col]
         self.passed_features = [col for col in passed_cols if 'Bin' in col]
@@ -198,7 +470,8 @@ class Correlator(object):
         because we're interested in the stationarized df!
         """
         mask = self.diff_grouped.index>=date_cutoff
-        self.passed_corrs = self.diff_grouped[mask].corr(method='spearman').loc[self.passed_features, self.passed_trends]
+        diff_grouped = self.diff_grouped[mask]
+        self.passed_corrs = spearman_block(diff_grouped[self.passed_features], diff_grouped[self.passed_trends])
         # self.passed_corrs['Percent'] = self.diff_grouped[mask].sum().iloc[len(self.passed_trends):, :][self.passed_trends]
         print(self.passed_corrs)
 
@@ -217,6 +490,35 @@ class Correlator(object):
         return correlated_features
 
 
+def spearman_block(left, right):
+    """
+    Spearman correlation of every column of left (rows) with every column of
+    right (columns), as in df.corr(method='spearman').loc[left.columns, right.columns]
+    but without computing the other pairs. Columns are grouped by their NaN rows;
+    for each pair of groups, the columns are ranked once over the rows both have
+    values in and correlated in one product of their standardized ranks.
+    """
+    corrs = pd.DataFrame(np.nan, index=left.columns, columns=right.columns)
+    groups = []
+    for frame in [left, right]:
+        valid = frame.notnull().values
+        side = {} # valid rows --> columns
+        for i, col in enumerate(frame.columns):
+            side.setdefault(valid[:, i].tobytes(), []).append(col)
+        groups.append(side)
+    for left_key, left_cols in groups[0].items():
+        for right_key, right_cols in groups[1].items():
+            rows = np.frombuffer(left_key, dtype=bool) & np.frombuffer(right_key, dtype=bool)
+            if rows.sum() < 2:
+                continue
+            ranks = np.hstack([left.loc[rows, left_cols].rank().values, right.loc[rows, right_cols].rank().values])
+            ranks = ranks - ranks.mean(axis=0)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                ranks = ranks / np.sqrt((ranks ** 2).sum(axis=0))
+            block = ranks[:, :len(left_cols)].T.dot(ranks[:, len(left_cols):])
+            corrs.loc[left_cols, right_cols] = np.clip(block, -1, 1)
+    return corrs
+
 def test_stationarity(timeseries, plot_test=False, critical_val=5):
     """
     Test stationarity of df, based on adfuller test and code found online at 
@@ -227,11 +529,11 @@ def test_stationarity(timeseries, plot_test=False, critical_val=5):
     - p-value must be smaller than 0.05
     """
     res = 'Passed'
-    #Determing rolling statistics
-    rolmean = timeseries.rolling(window=12,center=False).mean()
-    rolstd = timeseries.rolling(window=12,center=False).std()
-
     if plot_test:
+        #Determing rolling statistics
+        rolmean = timeseries.rolling(window=12,center=False).mean()
+        rolstd = timeseries.rolling(window=12,center=False).std()
+
         #Plot rolling statistics:
         fig = plt.figure(figsize=(12, 8))
         orig = plt.plot(timeseries, color='blue',label='Original')
@@ -243,36 +545,37 @@ def test_stationarity(timeseries, plot_test=False, critical_val=5):
     
     #Perform Dickey-Fuller test:
         print('Results of Dickey-Fuller Test:')
-    dftest = adfuller(timeseries, autolag='AIC')
-    dfoutput = pd.Series(dftest[0:4], index=['Test Statistic','p-value','#Lags Used','Number of Observations Used'])
-    for key,value in dftest[4].items():
-        dfoutput['Critical Value (%s)'%key] = value
+    dfoutput = pd.Series(adf_result(timeseries), index=RESULT_COLUMNS)
     if (dfoutput['Test Statistic']>dfoutput['Critical Value ({}%)'.format(str(critical_val))]):
         res = 'Failed!'
             
-    if (dfoutput['p-value']>0.05):
+    if (dfoutput['p-value']>MAX_P_VALUE):
         res = 'Failed!'
     
     if plot_test:
         print(dfoutput) 
     return res
 
-def plot_trend_features(grouped, trend, passed_features, date_cutoff=False, plot=True):
+def plot_trend_features(grouped, trend, passed_features, date_cutoff=False, plot=True, compact=False):
     """
     Plots raw trend counts (or proportions) along with desired feature. 
     Has dropdown menu to select feature to plot against trend.
 
     Counts are more readable than proportions, because auto-scaling causes axes to not be aligned 
     when plotting proportions. 
+
+    With compact, the figure only holds the trend and one feature (see
+    plot_formatters.compact_index), for a dashboard that switches features itself.
     """
     plot_config = {'kwargs': {'passed_features': passed_features,
-                              'date_cutoff': date_cutoff}, 
+                              'date_cutoff': date_cutoff,
+                              'compact': compact}, 
                    'df': grouped}
     if not plot:
         return plot_config
 
-    fig = pf.plot_trend_features(df=grouped, trend=trend, passed_features=passed_features, date_cutoff=date_cutoff)
-    plotly.offline.iplot(fig, filename='Correlating a trend (' + trend + ') with features')
+    fig = pf.plot_trend_features(df=grouped, trend=trend, **plot_config['kwargs'])
+    offline.iplot(fig, filename='Correlating a trend (' + trend + ') with features')
 
 def plot_trend_against_feature(grouped, desired_col, feature, time_interval='1m'):
     """
@@ -320,13 +623,14 @@ def compare_ratios(df, grouped, trend='virtual', features=[], time_interval = "1
     diffs = (trend_feat_ratios - gen_feat_ratios)#.divide(gen_feat_ratios, axis=0)
     return diffs
 
-def plot_diffs(diffs, feat_type=['Subject', 'Poverty', 'Metro', 'Grade', 'Various'], thres=0.045, date_line=None, plot=True):
+def plot_diffs(diffs, feat_type=['Subject', 'Poverty', 'Metro', 'Grade', 'Various'], thres=0.045, date_line=None, plot=True, window=8):
     """
     Plots ratio differences computed by compare_ratios. 
     Plots only those where mean of last 5 values is above thres (i.e. those that are 'interesting')
 
     Plot Michael's line, basically a line at any point in time with date_line param.
     Plot only certain types of features by passing list of some or all in 'Subject', 'Income' or 'Grade'.
+    The ratios are smoothed with a rolling mean over window periods.
     """
     # Limit to only 'Subject', 'Poverty', 'Metro', 'Grade', 'Various':
     if feat_type:
@@ -337,7 +641,7 @@ def plot_diffs(diffs, feat_type=['Subject', 'Poverty', 'Metro', 'Grade', 'Variou
         diffs = diffs[desired_cols]
         
     # Rolling mean to make plot more readable
-    to_plot = diffs.rolling(8).mean()
+    to_plot = diffs.rolling(window).mean()
     to_plot.dropna(how='all', inplace=True)
     
     # Set threshold to only view meaningful ratios. Get sorted features fo easier readability, then plot
@@ -356,17 +660,28 @@ def plot_diffs(diffs, feat_type=['Subject', 'Poverty', 'Metro', 'Grade', 'Variou
     fig = pf.plot_diffs(df=to_plot, trend=None, to_plot_cols=to_plot_cols, date_line=date_line)
 
     #PICKUP HERE
-    plotly.offline.iplot(fig, filename='diverging_ratios')
-
-def ggl_trends(grouped, keyword):
-    pytrends = TrendReq(hl='en-US', tz=360)
-    kw_list = [keyword]
-    pytrends.build_payload(kw_list, cat=0, timeframe='all', geo='US', gprop='')
-    ggl_trends = pytrends.interest_over_time()
-    if ggl_trends.empty:
-        return pd.DataFrame() 
-    grouped_ggl_trends = ggl_trends.groupby(pd.Grouper(freq='1m')).mean().rename(columns={keyword: 'Google Trends'})
-    return grouped.merge(grouped_ggl_trends, left_index=True, right_index=True, how='inner')
+    offline.iplot(fig, filename='diverging_ratios')
+
+def ggl_trends(grouped, keyword, provider=None):
+    """
+    Monthly Google Trends index of keyword (from provider, live through
+    pytrends by default) merged onto grouped as a 'Google Trends' column.
+    """
+    return ggl_trends_all(grouped, [keyword], provider)[keyword]
+
+def ggl_trends_all(grouped, keywords, provider=None):
+    """ggl_trends for every keyword, requested from provider together: a dict of keyword --> frame."""
+    if provider is None:
+        provider = PytrendsProvider()
+    trends = provider.interest_over_time(list(keywords), timeframe='all', geo='US')
+    all_trends = {}
+    for keyword in keywords:
+        if keyword not in trends.columns:
+            all_trends[keyword] = pd.DataFrame()
+            continue
+        grouped_ggl_trends = trends[[keyword]].groupby(pd.Grouper(freq='1m')).mean().rename(columns={keyword: 'Google Trends'})
+        all_trends[keyword] = grouped.merge(grouped_ggl_trends, left_index=True, right_index=True, how='inner')
+    return all_trends
 
 def plot_ggl_trends(grouped, keyword, plot=True):
     plot_config = {'kwargs': {}, 
@@ -375,4 +690,4 @@ def plot_ggl_trends(grouped, keyword, plot=True):
         return plot_config
 
     fig = pf.plot_ggl_trends(df=grouped, trend=keyword)
-    plotly.offline.iplot(fig, filename='multiple-axes-double')
+    offline.iplot(fig, filename='multiple-axes-double')
@@ -0,0 +1,156 @@
+"""
+Persistent monthly feature series for demo.Correlator.
+
+The monthly Bin_* feature sums only depend on the projects table, and months
+that are over don't change from one daily run to the next. FeatureStore keeps
+them in a pickle, along with the number of projects per month and the
+features' stationarity results. Each run only encodes the projects posted
+since the last complete month it holds, plus the month in progress, so the
+Correlator is left with the keyword side.
+"""
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from lib.features import encode_features, bin_sums
+from lib.stationarity import stationarity_table
+
+DATE_COL = 'Project Posted Date'
+
+def month_start(timestamp):
+    return pd.Timestamp(timestamp.year, timestamp.month, 1)
+
+def stack_months(first, second):
+    """
+    Rows of first then second, over first's columns followed by those only in
+    second (0 where a frame doesn't have a column). Aligned before the concat,
+    so no column sorting is involved on any pandas version.
+    """
+    columns = first.columns.append(second.columns[~second.columns.isin(first.columns)])
+    return pd.concat([first.reindex(columns=columns), second.reindex(columns=columns)]).fillna(0).astype(np.int64)
+
+class FeatureStore(object):
+    """
+    Monthly Bin_* feature sums and project counts over all projects: complete
+    months in self.sums/self.sizes (persisted), the month in progress in
+    self.current (recomputed on every update).
+    """
+    time_interval = '1m'
+
+    def __init__(self, path=None, date_col=DATE_COL):
+        self.path = path
+        self.date_col = date_col
+        self.start = None # first day of the first month
+        self.end = None # first day of the month in progress
+        self.sums = None
+        self.sizes = None
+        self.current = None # (sums, sizes) of the month in progress
+        self.stationarity = {} # (prop, yearly_seasonality, critical_val) --> stationarity_table
+
+    @classmethod
+    def load(cls, path, date_col=DATE_COL):
+        """Store saved at path, or an empty one that will save there."""
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                store = pickle.load(f)
+            store.path = path
+            return store
+        return cls(path, date_col)
+
+    def save(self, path=None):
+        with open(path or self.path, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def update(self, df):
+        """
+        Bring the store up to date with the projects in df. Months completed
+        since the last update are encoded and appended (all of df's, the first
+        time or if df starts before the store), and the month in progress is
+        recomputed. Returns the number of months appended.
+
+        Complete months are assumed not to change; call reset() if they did.
+        """
+        dates = df[self.date_col]
+        first, last = dates.min(), dates.max()
+        end = month_start(last)
+        if self.sums is None or first < self.start:
+            self.reset()
+            self.start = month_start(first)
+            self.end = self.start
+        new_months = pd.date_range(self.end, end, freq='M')
+        if len(new_months):
+            new = ((dates >= self.end) & (dates < end)).values
+            sums, sizes = self.month_sums(df[new], new_months)
+            if self.sums is None:
+                self.sums, self.sizes = sums, sizes
+            else:
+                self.sums = stack_months(self.sums, sums)
+                self.sizes = pd.concat([self.sizes, sizes])
+            self.end = end
+            self.stationarity = {}
+        elif self.sums is None:
+            self.sums, self.sizes = self.month_sums(df.iloc[:0], new_months)
+        current = (dates >= end).values
+        self.current = self.month_sums(df[current], pd.date_range(end, periods=1, freq='M'))
+        return len(new_months)
+
+    def reset(self):
+        self.__init__(self.path, self.date_col)
+
+    def month_sums(self, df, months):
+        """(Bin_* sums per month, projects per month) of df, over the month-end labels in months."""
+        features = encode_features(df)
+        features = features.select(features.bin_columns)
+        codes = self.codes(df[self.date_col], months)
+        sums = bin_sums(codes, len(months), features.matrix).astype(np.int64)
+        sizes = np.bincount(codes[codes >= 0], minlength=len(months))
+        return (pd.DataFrame(sums, index=months, columns=features.columns),
+                pd.Series(sizes, index=months))
+
+    @staticmethod
+    def codes(dates, months):
+        """Position in months (month-end labels) of the month of each date, -1 if outside."""
+        starts = months.to_period('M').to_timestamp().values
+        codes = np.searchsorted(starts, dates.values, side='right') - 1
+        if len(months):
+            codes[dates.values >= (months[-1] + pd.Timedelta(days=1)).to_datetime64()] = -1
+        return codes
+
+    @property
+    def index(self):
+        return self.sums.index.append(self.current[0].index)
+
+    @property
+    def feature_names(self):
+        return list(self.grouped().columns)
+
+    def bin_codes(self, dates):
+        """Position of each date's month in self.index, -1 if outside (like helpers.time_bins)."""
+        return self.codes(dates, self.index)
+
+    def grouped(self, prop=False):
+        """Feature sums (or means, if prop) per month, up to and including the month in progress."""
+        sums = stack_months(self.sums, self.current[0])
+        sums.index.name = self.date_col
+        if not prop:
+            return sums
+        sizes = pd.concat([self.sizes, self.current[1]])
+        return sums.div(sizes, axis=0)
+
+    def feature_stationarity(self, prop=False, yearly_seasonality=None, critical_val=5, processes=None):
+        """
+        stationarity_table of the features' first differences (see
+        Correlator.stationarize), over the complete months only. Kept until
+        the next month is appended.
+        """
+        key = (prop, yearly_seasonality, critical_val)
+        if key not in self.stationarity:
+            grouped = self.grouped(prop).loc[self.sums.index]
+            diffs = grouped.diff()
+            if yearly_seasonality:
+                diffs = diffs.diff(yearly_seasonality)
+            self.stationarity[key] = stationarity_table(diffs, critical_val=critical_val,
+                                                        processes=processes, cache_columns=[])
+        return self.stationarity[key]
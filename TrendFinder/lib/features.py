@@ -0,0 +1,210 @@
+"""
+Binary and ordinal project features for demo.Correlator.
+
+encode_features builds every Bin_*/Ord_* feature from categorical codes in
+one pass, as a sparse (project x feature) matrix with a column index, rather
+than adding a dense int64 column per category value to the projects frame.
+The keyword_matrix_* functions do the same for trend keyword indicators.
+"""
+import re
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+# Fields one-hot encoded as Bin_<field>(<value>), with missing values as n/a
+CATEGORICAL_FIELDS = ['Project Grade Level', 'School Metro Area', 'Project Subject', 'Project Subject Category']
+# n/a features not worth keeping
+DROPPED_FEATURES = ['Bin_Project Grade Level(n/a)', 'Bin_School Metro Area(n/a)']
+
+YES_NO = {"Yes": 1, "No": 0}
+# Features with hand-picked values: name --> (field, {value: number}), other values are 0
+CUSTOM_FEATURES = OrderedDict([
+    ('Bin_Poverty(low income)', ('School Poverty Level', {"low income": 1, "upper income": 0})),
+    ('Ord_Grade_Level', ('Project Grade Level', {"Grades PreK-2": 1, "Grades 3-5": 2,
+                                                 "Grades 6-8": 3, "Grades 9-12": 4})),
+    ('Bin_Charter(Yes)', ('School Is Charter (Yes / No)', YES_NO)),
+    ('Bin_KIPP(Yes)', ('School Is KIPP (Yes / No)', YES_NO)),
+    ('Bin_NLNS(Yes)', ('School Is NLNS (Yes / No)', YES_NO)),
+    ('Bin_Magnet(Yes)', ('School Is Magnet (Yes / No)', YES_NO)),
+    ('Bin_Year_Round(Yes)', ('School Is Year Round (Yes / No)', YES_NO))
+])
+# Every projects column encode_features reads
+FEATURE_FIELDS = CATEGORICAL_FIELDS + [field for field, _ in CUSTOM_FEATURES.values() if field not in CATEGORICAL_FIELDS]
+
+class FeatureMatrix(object):
+    """Sparse uint8 (row x feature) matrix, with the feature names as a column index."""
+    def __init__(self, matrix, columns):
+        self.matrix = sp.csr_matrix(matrix)
+        self.columns = pd.Index(columns)
+
+    @property
+    def bin_columns(self):
+        return [col for col in self.columns if 'Bin' in col]
+
+    def column(self, name):
+        """Dense values of one column."""
+        return self.matrix[:, self.columns.get_loc(name)].toarray().ravel()
+
+    def rows(self, name):
+        """Sorted positions of the rows with a nonzero value in column name."""
+        column = self.matrix[:, self.columns.get_loc(name)].tocsc()
+        return np.sort(column.indices[column.data != 0])
+
+    def join(self, other):
+        """Columns of self (except those other redefines) followed by other's."""
+        keep = [col for col in self.columns if col not in other.columns]
+        return FeatureMatrix(sp.hstack([self.select(keep).matrix, other.matrix], format='csr'),
+                             keep + list(other.columns))
+
+    def positions(self, columns):
+        """Positions of the given columns, KeyError if self doesn't have some (like df[columns])."""
+        positions = self.columns.get_indexer(columns)
+        if (positions < 0).any():
+            missing = [col for col, position in zip(columns, positions) if position < 0]
+            raise KeyError('{} not in columns'.format(missing))
+        return positions
+
+    def select(self, columns):
+        """FeatureMatrix restricted to the given columns, in that order."""
+        return FeatureMatrix(self.matrix[:, self.positions(columns)], columns)
+
+    def reindex(self, columns):
+        """Like select, but columns self doesn't have are all zeros."""
+        positions = self.columns.get_indexer(columns)
+        # -1 (missing) positions are left out rather than indexed
+        found = np.flatnonzero(positions >= 0)
+        coo = self.matrix[:, positions[found]].tocoo()
+        matrix = sp.csr_matrix((coo.data, (coo.row, found[coo.col])), shape=(self.matrix.shape[0], len(columns)))
+        return FeatureMatrix(matrix, columns)
+
+    def take(self, rows):
+        """FeatureMatrix restricted to the given row positions (or boolean mask)."""
+        return FeatureMatrix(self.matrix[rows], self.columns)
+
+    def to_frame(self, index=None):
+        return pd.DataFrame(self.matrix.toarray(), index=index, columns=self.columns)
+
+def project_fields(df, fields=FEATURE_FIELDS, date_col='Project Posted Date', id_col='Project ID'):
+    """
+    New frame of only the date and the feature fields of df, indexed by id_col,
+    with the fields as categoricals. df itself is left as is.
+    """
+    projected = pd.DataFrame({field: df[field].astype('category').values for field in fields},
+                             index=pd.Index(df[id_col].values, name=id_col), columns=fields)
+    projected.insert(0, date_col, df[date_col].values)
+    return projected
+
+def factorize_missing(values, missing='n/a'):
+    """pd.factorize of values with missing values as their own option, like fillna(missing) first."""
+    codes, options = pd.factorize(values)
+    options = list(np.asarray(options))
+    nulls = codes < 0
+    if nulls.any():
+        # missing takes its place in order of first appearance
+        first = np.argmax(nulls)
+        position = codes[:first].max() + 1 if first else 0
+        codes = np.where(codes >= position, codes + 1, codes)
+        codes[nulls] = position
+        options.insert(position, missing)
+    return codes, options
+
+def encode_features(df, fields=CATEGORICAL_FIELDS, custom=CUSTOM_FEATURES, drop=DROPPED_FEATURES):
+    """
+    Encode the projects in df as a FeatureMatrix: one Bin_ column per value of
+    each categorical field (in order of appearance), then the custom features.
+    All entries are collected as (row, column, value) triplets and the matrix is
+    built once.
+    """
+    n_rows = len(df)
+    rows, cols, values, columns = [], [], [], []
+    for field in fields:
+        codes, options = factorize_missing(df[field])
+        rows.append(np.arange(n_rows))
+        cols.append(codes + len(columns))
+        values.append(np.ones(n_rows, dtype=np.uint8))
+        columns.extend('Bin_{}({})'.format(field, option) for option in options)
+    for name, (field, mapping) in custom.items():
+        # map through category codes so each distinct value is looked up once
+        codes, options = pd.factorize(df[field])
+        option_values = pd.Series(np.asarray(options)).map(mapping).fillna(0).values.astype(np.uint8)
+        value = np.where(codes >= 0, option_values[np.maximum(codes, 0)], 0).astype(np.uint8)
+        nonzero = np.flatnonzero(value)
+        rows.append(nonzero)
+        cols.append(np.full(len(nonzero), len(columns)))
+        values.append(value[nonzero])
+        columns.append(name)
+    matrix = sp.csr_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))),
+                           shape=(n_rows, len(columns)), dtype=np.uint8)
+    features = FeatureMatrix(matrix, columns)
+    keep = [col for col in columns if col not in drop]
+    if len(keep) < len(columns):
+        features = features.select(keep)
+    return features
+
+def bin_sums(codes, n_bins, matrix):
+    """
+    Column sums of matrix per bin (rows with code -1 are skipped), as a dense
+    float array of shape (n_bins, n_columns).
+    """
+    valid = np.flatnonzero(codes >= 0)
+    grouping = sp.csr_matrix((np.ones(len(valid)), (codes[valid], valid)), shape=(n_bins, matrix.shape[0]))
+    sums = grouping.dot(matrix)
+    return sums.toarray() if sp.issparse(sums) else np.asarray(sums)
+
+def indicator_matrix(rows, cols, shape, columns):
+    """FeatureMatrix with a 1 at each (row, col) pair, duplicates counted once."""
+    matrix = sp.csr_matrix((np.ones(len(rows), dtype=np.uint8), (rows, cols)), shape=shape)
+    matrix.sum_duplicates()
+    matrix.data[:] = 1
+    return FeatureMatrix(matrix, columns)
+
+def keyword_matrix_from_ids(index, keywords_dict):
+    """
+    (row x keyword) indicators from {keyword: [project IDs]}: every row whose ID
+    (in index) is in a keyword's list, like index.isin(ids), for all keywords
+    at once. index may repeat IDs; IDs not in index are skipped.
+    """
+    keywords = list(keywords_dict)
+    id_lists = [keywords_dict[kw] for kw in keywords]
+    codes, ids = pd.factorize([id_key for id_list in id_lists for id_key in id_list])
+    cols = np.repeat(np.arange(len(keywords)), [len(id_list) for id_list in id_lists])
+    # (ID x keyword), then each row takes its ID's keywords
+    id_keywords = indicator_matrix(codes, cols, (len(ids), len(keywords)), keywords).matrix
+    id_positions = pd.Index(ids).get_indexer(index)
+    rows = np.flatnonzero(id_positions >= 0)
+    found = id_keywords[id_positions[rows]].tocoo()
+    return indicator_matrix(rows[found.row], found.col, (len(index), len(keywords)), keywords)
+
+def keyword_matrix_from_text(texts, keywords):
+    """
+    (row x keyword) indicators of which keywords each text contains (as literal
+    substrings), from a single scan over all the texts.
+
+    The texts are joined with newlines and searched once with a lookahead
+    alternation of every keyword, longest first, which reports the longest
+    keyword starting at every position (a multi-pattern matcher in the spirit
+    of Aho-Corasick, run by the re engine). Shorter keywords at the same spot
+    are substrings of the one reported, so each match also counts the
+    keywords it contains.
+    """
+    keywords = list(keywords)
+    texts = ['' if text is None else str(text) for text in texts]
+    patterns = sorted(set(kw for kw in keywords if kw), key=len, reverse=True)
+    if not patterns or not texts:
+        return indicator_matrix([], [], (len(texts), len(keywords)), keywords)
+    # keyword --> every column it fills, including keywords it contains
+    positions = {}
+    for i, kw in enumerate(keywords):
+        positions.setdefault(kw, []).append(i)
+    implied = {kw: [i for other in patterns if other in kw for i in positions[other]] for kw in patterns}
+    regex = re.compile('(?=({}))'.format('|'.join(re.escape(kw) for kw in patterns)))
+    starts = np.cumsum([0] + [len(text) + 1 for text in texts[:-1]])
+    match_starts, cols = [], []
+    for match in regex.finditer('\n'.join(texts)):
+        kw_cols = implied[match.group(1)]
+        match_starts.extend([match.start()] * len(kw_cols))
+        cols.extend(kw_cols)
+    rows = np.searchsorted(starts, match_starts, side='right') - 1
+    return indicator_matrix(rows, cols, (len(texts), len(keywords)), keywords)
@@ -1,55 +1,166 @@
 import itertools
 
+import numpy as np
 import pandas as pd
-import plotly
-import plotly.graph_objs as go
 from fuzzywuzzy import fuzz, process
 
 from lib import plot_formatters as pf
-from .geo_data.geo_mappings import REGION_MAP, ALL_SPLITS
-
-COUNTIES_PATH = './geo_data/PEP_2016_PEPANNRES_with_ann.csv'
-COUNTIES = pd.read_csv(COUNTIES_PATH, skiprows=1, encoding = 'ISO-8859-1')[['Geography', 'Population Estimate (as of July 1) - 2016']].copy()
-COUNTIES['rank'] = COUNTIES['Population Estimate (as of July 1) - 2016'].sort_values(ascending=False).rank(ascending=False)
-COUNTIES['state'] = COUNTIES['Geography'].str.split(', ', expand=True)[1]
+from lib.lazy import lazy_import
+from .geo_data.geo_mappings import REGION_MAP, ALL_SPLITS, compile_split
+from .geo_data.reference import get_counties, get_counties_by_state, get_compiled_splits
+
+offline = lazy_import('plotly.offline')
+
+# time grains splits can be binned at: grain --> (pandas frequency, nominal length in days)
+GRAINS = {
+	'1W': ('W', 7),
+	'2W': ('2W', 14),
+	'1M': ('M', 30.4375),
+	'1Q': ('Q', 91.3125)
+}
+# calendar windows for rolling proportions and tickers, in days
+WINDOW_DAYS = {
+	'2W': 14,
+	'1M': 30.4375,
+	'3M': 91.3125,
+	'6M': 182.625,
+	'1Y': 365.25
+}
+
+def window_periods(window, grain):
+	"""Number of grain-sized bins in a calendar window ('1M', '1Y', ...); ints are bin counts already."""
+	if isinstance(window, str):
+		return max(1, int(WINDOW_DAYS[window] // GRAINS[grain][1]))
+	return window
+
+# windows for the choropleth aggregates, split at the current trend period's start
+MAP_WINDOWS = ['current', 'historical']
+
+def window_state_counts(df, current_start):
+	"""Projects per state in the current (after current_start) and historical windows, in one grouped pass."""
+	is_current = (df['Project Posted Date'] > pd.Timestamp(current_start)).values
+	window = np.where(is_current, MAP_WINDOWS[0], MAP_WINDOWS[1])
+	counts = df.groupby([df['School State'].values, window]).size().unstack(fill_value=0)
+	return counts.reindex(index=sorted(REGION_MAP), columns=MAP_WINDOWS, fill_value=0)
+
+def share_lift_table(counts, baseline_counts):
+	"""Count, share of the window's total and lift over the baseline share, per row and window."""
+	share = counts / counts.sum().replace(0, np.nan)
+	baseline_share = baseline_counts / baseline_counts.sum().replace(0, np.nan)
+	lift = share / baseline_share.replace(0, np.nan)
+	table = pd.DataFrame(index=counts.index)
+	for window in MAP_WINDOWS:
+		table['{}_count'.format(window)] = counts[window]
+		table['{}_share'.format(window)] = share[window].round(5)
+		table['{}_lift'.format(window)] = lift[window].round(3)
+	return table
+
+def state_region_tables(subset_df, baseline_counts, current_start):
+	"""
+	Per-trend state and region share/lift tables for the current and historical
+	windows, against baseline_counts (window_state_counts of all projects).
+	"""
+	state_counts = window_state_counts(subset_df, current_start)
+	state_table = share_lift_table(state_counts, baseline_counts)
+	state_table.insert(0, 'region', state_table.index.map(REGION_MAP))
+	region_table = share_lift_table(state_counts.groupby(REGION_MAP).sum(),
+									baseline_counts.groupby(REGION_MAP).sum())
+	return state_table, region_table
 
 class GeoSplitter:
 	
 	min_projects = 5
-	grouper = pd.Grouper(key='Project Posted Date', freq='2W')
+	grain = '2W'
 
-	def __init__(self, df):
+	def __init__(self, df, grain=None):
+		if grain is not None:
+			self.grain = grain
 		self.df = df.copy() # initialize with merged tech_df
 		self.df['Project Posted Date'] = pd.to_datetime(self.df['Project Posted Date'])
 		self.df_county_merge()
+		self.categories, self.compiled_splits = get_compiled_splits()
+		self.codes = {} # column --> (codes, categories)
+		self.masks = {} # split_name --> boolean array over self.df rows
+		# day of each project, as an offset from the first day, for per-day counts;
+		# -1 for projects without a posted date, which are left out (like helpers.time_bins)
+		days = self.df['Project Posted Date'].values.astype('datetime64[D]')
+		dated = ~np.isnat(days)
+		self.first_day = days[dated].min() if dated.any() else np.datetime64('today', 'D')
+		self.day_codes = np.full(len(days), -1, dtype=np.int64)
+		self.day_codes[dated] = (days[dated] - self.first_day).astype(np.int64)
+		self.n_days = int(self.day_codes.max()) + 1 if dated.any() else 0
+		self.daily_totals = np.bincount(self.day_codes[dated], minlength=self.n_days)
 
 	def apply_map(self, map_on_col, map_to_col, map_def):
 		self.df[map_to_col] = self.df[map_on_col].map(map_def)
+		self.codes.pop(map_to_col, None)
+
+	def get_codes(self, column):
+		# categorical codes of a column, computed once; -1 where the value is outside the categories
+		if column not in self.codes:
+			if column in self.categories:
+				categories = self.categories[column]
+				codes = pd.Categorical(self.df[column], categories=categories).codes
+			else:
+				codes, categories = pd.factorize(self.df[column])
+			self.codes[column] = (np.asarray(codes), categories)
+		return self.codes[column]
+
+	def get_split_mask(self, split, column, split_name=None):
+		# split membership of every project, as a fancy-index into the split's lookup table
+		codes, categories = self.get_codes(column)
+		compiled = self.compiled_splits.get(split_name)
+		if (compiled is not None and compiled['column'] == column and compiled['list'] == list(split)
+				and categories is self.categories.get(column)):
+			lookup = compiled['lookup']
+		elif categories.isin(split).sum() == len(set(split)):
+			lookup = compile_split(split, categories)
+		else:
+			# split names values outside the fixed categories
+			return self.df[column].isin(split).values
+		return lookup[codes]
 
 	def df_county_merge(self):
+		counties = get_counties()
 		self.df['School County'] = self.df['School County'].str.replace(r"(\s\(.*?\))", '')
 		self.df['county_full'] = self.df['School County'] + ' County, ' + self.df['School State']
 		self.df = self.df[~self.df['county_full'].isnull()].copy()
-		unmatched = ~self.df['county_full'].isin(COUNTIES['Geography'])
-		def get_match(x):
-			filtered = COUNTIES[COUNTIES['state'] == x['School State']]
-			return process.extractOne(x['School County'], filtered['Geography'], scorer=fuzz.token_sort_ratio)[0]
-		self.df.loc[unmatched, 'county_full'] = self.df[unmatched].apply(get_match, axis=1)
-		self.df = self.df.merge(COUNTIES, left_on='county_full', right_on='Geography', how='left')
+		unmatched = ~self.df['county_full'].isin(counties['Geography'])
+		if unmatched.any():
+			# fuzzy match each distinct (county, state) pair once, against that state's counties only
+			counties_by_state = get_counties_by_state()
+			pairs = self.df.loc[unmatched, ['School County', 'School State']].drop_duplicates()
+			matches = {}
+			for county, state in pairs.itertuples(index=False):
+				candidates = counties_by_state.get(state, [])
+				if candidates:
+					matches[(county, state)] = process.extractOne(county, candidates, scorer=fuzz.token_sort_ratio)[0]
+			keys = zip(self.df.loc[unmatched, 'School County'], self.df.loc[unmatched, 'School State'])
+			self.df.loc[unmatched, 'county_full'] = [matches.get(key) for key in keys]
+		self.df = self.df.merge(counties, left_on='county_full', right_on='Geography', how='left')
 
 	# split - list
-	def get_split_df(self, split, column, split_name):
+	def get_split_df(self, split, column, split_name, grain=None):
+		daily_split = self.get_daily_split_df(split, column, split_name)
+		return self.resample_split_df(daily_split, split_name, grain)
+
+	def get_daily_split_df(self, split, column, split_name):
+		# in/not in split counts per day; every coarser grain is summed from these
 		in_split = 'in_{}'.format(split_name)
 		not_in_split = 'not_{}'.format(split_name)
+		is_in = self.get_split_mask(split, column, split_name)
+		self.masks[split_name] = is_in
+		in_counts = np.bincount(self.day_codes[is_in & (self.day_codes >= 0)], minlength=self.n_days)
+		index = pd.date_range(self.first_day, periods=self.n_days, freq='D')
+		return pd.DataFrame({in_split: in_counts,
+							 not_in_split: self.daily_totals - in_counts}, index=index)
+
+	def resample_split_df(self, daily_split, split_name, grain=None):
+		# bin daily counts at the given grain, then add totals and relative proportions
 		total_split = 'total_{}'.format(split_name)
-		self.df[split_name] = self.df[column].isin(split).replace({True: in_split, False: not_in_split})
-		group_split = self.df.groupby([self.grouper, split_name]).size().unstack().fillna(0)
-		try:
-			group_split[total_split] = group_split[in_split] + group_split[not_in_split]
-		except KeyError:
-			# there are no projects in this split
-			group_split[in_split] = 0
-			group_split[total_split] = group_split[in_split] + group_split[not_in_split]
+		freq = GRAINS[grain or self.grain][0]
+		group_split = daily_split.resample(freq).sum()
+		group_split[total_split] = group_split.sum(axis=1)
 		group_split = group_split.join(group_split.divide(group_split[total_split], axis='index'), rsuffix='_rel')
 		group_split = group_split[group_split[total_split] > self.min_projects].copy()
 		return group_split		
@@ -109,20 +220,26 @@ class GeoMeta:
 
 	# splits --> dict with split_name: {'column': col, 
 	#	 								'split':list, populate results}
-	# accepted grouper values: 
-	# 2w, 1m, 3m, 1y
-	TWO_WEEKS = 1
-	ONE_MONTH = 2
-	THREE_MONTHS = 6
-	SIX_MONTHS = 13
-	ONE_YEAR = 26
-	window_sizes = [1, 2, 6, 13, 26]
-	shift_sizes = [1, 2, 6, 13, 26]
-
-
-	def __init__(self, df):
-		self.splitter = GeoSplitter(df)
+	# windows and shifts are calendar units (see WINDOW_DAYS), converted to
+	# bins of the current grain; plain ints are still taken as bin counts
+	TWO_WEEKS = '2W'
+	ONE_MONTH = '1M'
+	THREE_MONTHS = '3M'
+	SIX_MONTHS = '6M'
+	ONE_YEAR = '1Y'
+	window_sizes = [TWO_WEEKS, ONE_MONTH, THREE_MONTHS, SIX_MONTHS, ONE_YEAR]
+	shift_sizes = [TWO_WEEKS, ONE_MONTH, THREE_MONTHS, SIX_MONTHS, ONE_YEAR]
+	# rolling windows shown on the dashboard, precomputed together per split
+	dashboard_windows = [ONE_MONTH, THREE_MONTHS, SIX_MONTHS, ONE_YEAR]
+
+
+	def __init__(self, df, grain='2W'):
+		self.grain = grain
+		self.splitter = GeoSplitter(df, grain=grain)
 		self.splits = {}
+		# split_name --> {'cumulative': series, 'rolling': {window: series}}
+		self.proportions = {}
+		self.trendiest = None
 		self.apply_map("School State", "region", REGION_MAP)
 
 	def apply_map(self, map_on_col, map_to_col, map_def):
@@ -137,13 +254,50 @@ class GeoMeta:
 			self.get_all_permutations(split_name)
 
 	def split_on(self, split_name, split_col, split_on):
-		split_df =  self.splitter.get_split_df(split_on, split_col, split_name)
+		daily_df = self.splitter.get_daily_split_df(split_on, split_col, split_name)
 		self.splits[split_name] = {}
 		self.splits[split_name]['split_col'] = split_col
 		self.splits[split_name]['split_on'] = split_on
-		self.splits[split_name]['split_df'] = split_df
+		self.splits[split_name]['daily_df'] = daily_df
+		self.splits[split_name]['split_df'] = self.splitter.resample_split_df(daily_df, split_name, self.grain)
 		self.splits[split_name]['ticker'] = {'rolling': {},
 						     'cumulative': {}}
+		self.clear_proportions(split_name)
+
+	def set_grain(self, grain):
+		# re-bin every split from its daily counts, without regrouping the projects
+		self.grain = grain
+		for split_name, split in self.splits.items():
+			split['split_df'] = self.splitter.resample_split_df(split['daily_df'], split_name, grain)
+			split['ticker'] = {'rolling': {},
+							   'cumulative': {}}
+		self.clear_proportions()
+
+	def clear_proportions(self, split_name=None):
+		# drop memoized proportions for one split (or all), and the trendiest ordering
+		if split_name is None:
+			self.proportions = {}
+		else:
+			self.proportions.pop(split_name, None)
+		self.trendiest = None
+
+	def get_proportions(self, split_name, windows=None):
+		# cumulative and rolling proportions for a split, computed once and shared by the plot methods
+		in_split = 'in_{}'.format(split_name)
+		not_in_split = 'not_{}'.format(split_name)
+		split_df = self.splits[split_name]['split_df']
+		if split_name not in self.proportions:
+			self.proportions[split_name] = {
+				'cumulative': self.splitter.cumulative_proportion(split_df, in_split, not_in_split),
+				'rolling': {}}
+			if windows is None:
+				windows = self.dashboard_windows
+		rolling = self.proportions[split_name]['rolling']
+		for window in (windows or []):
+			if window not in rolling:
+				rolling[window] = self.splitter.rolling_proportion(split_df, in_split, not_in_split,
+																   window=window_periods(window, self.grain))
+		return self.proportions[split_name]
 	
 	def get_split_df(self, split_name):
 		try:
@@ -152,11 +306,9 @@ class GeoMeta:
 			print("Split {} does not exist".format(split_name))
 
 	def get_projects_in_split(self, split_name):
-		in_split = 'in_{}'.format(split_name)
-		not_in_split = 'in_{}'.format(split_name)
-		return self.splitter.df[self.splitter.df[split_name]==in_split].copy()
+		return self.splitter.df[self.splitter.masks[split_name]].copy()
 
-	def plot_splits(self, trend, plot=True):
+	def plot_splits(self, trend, plot=True, compact=False):
 		df = None
 		splits = self.find_trendiest()
 		split_names = []
@@ -169,41 +321,41 @@ class GeoMeta:
 				tmp, line_pos = self.plot_split(split[1], plot=False)
 				df = pd.concat([df, tmp])
 			line_pos_dict[split[1]] = line_pos
-		plot_config = {'kwargs':{'split_names':split_names, 'line_pos_dict': line_pos_dict},
+		plot_config = {'kwargs':{'split_names':split_names, 'line_pos_dict': line_pos_dict, 'compact': compact},
 					   'df':df}
 		if not plot:
 			return plot_config
-		fig = pf.plot_splits(df, trend, split_names=split_names)
-		plotly.offline.iplot(fig)
+		fig = pf.plot_splits(df, trend, **plot_config['kwargs'])
+		offline.iplot(fig)
 
-	def plot_rolling_splits(self, trend, window, plot=True):
+	def plot_rolling_splits(self, trend, window, plot=True, compact=False):
 		df = pd.DataFrame()
 		splits = self.find_trendiest()
 		split_names = []
 		for split in splits:
 			split_names.append(split[1])
 			df[split[1]] = self.plot_rolling_split(split[1], window, plot=False)
-		plot_config = {'kwargs':{'split_names':split_names, 'window': window},
+		plot_config = {'kwargs':{'split_names':split_names, 'window': window, 'compact': compact},
 					   'df':df}
 		if not plot:
 			return plot_config
-		fig = pf.plot_rolling_splits(df, trend, window=window, split_names=split_names)
-		plotly.offline.iplot(fig)
+		fig = pf.plot_rolling_splits(df, trend, **plot_config['kwargs'])
+		offline.iplot(fig)
 
 
-	def plot_cumulative_splits(self, trend, plot=True):
+	def plot_cumulative_splits(self, trend, plot=True, compact=False):
 		df = pd.DataFrame()
 		splits = self.find_trendiest()
 		split_names = []
 		for split in splits:
 			split_names.append(split[1])
 			df[split[1]] = self.plot_cumulative_split(split[1], plot=False)
-		plot_config = {'kwargs':{'split_names':split_names},
+		plot_config = {'kwargs':{'split_names':split_names, 'compact': compact},
 					   'df':df}
 		if not plot:
 			return plot_config
-		fig = pf.plot_cumulative_splits(df, trend, split_names=split_names)
-		plotly.offline.iplot(fig)
+		fig = pf.plot_cumulative_splits(df, trend, **plot_config['kwargs'])
+		offline.iplot(fig)
 
 
 	def plot_split(self, split_name, plot=True):
@@ -223,7 +375,8 @@ class GeoMeta:
 		
 	def get_split_ticker(self, split_name, shift=1, window=6, rolling=True):
 		split_df = self.splits[split_name]['split_df']
-		ticker = self.splitter.calc_ticker(split_df, split_name, shift, window, rolling)
+		ticker = self.splitter.calc_ticker(split_df, split_name, window_periods(shift, self.grain),
+										   window_periods(window, self.grain), rolling)
 		if rolling:
 			if not window in self.splits[split_name]['ticker']['rolling']:
 				self.splits[split_name]['ticker']['rolling'][window] = {}
@@ -233,11 +386,16 @@ class GeoMeta:
 		return ticker
 
 	def find_trendiest(self, as_df=False):
-		trends = []
-		for split in self.splits:
-			trend_mag = self.splitter.get_trend_magnitude(self.splits[split]['split_df'], split)
-			trends.append((trend_mag, split))
-		trends.sort(reverse=True)
+		if self.trendiest is None:
+			trends = []
+			for split in self.splits:
+				# same as splitter.get_trend_magnitude, from the memoized cumulative proportion
+				split_over_time = self.get_proportions(split)['cumulative']
+				trend_mag = split_over_time.max() - split_over_time.min()
+				trends.append((trend_mag, split))
+			trends.sort(reverse=True)
+			self.trendiest = trends
+		trends = list(self.trendiest)
 		if as_df:
 			trends = pd.DataFrame(trends, columns=['trend_mag', 'split'])
 		return trends
@@ -261,19 +419,13 @@ class GeoMeta:
 			print("please generate the ticker first, or run get_all_permutations(split_name)")
 
 	def plot_rolling_split(self, split_name, window=6, plot=True):
-		in_split = 'in_{}'.format(split_name)
-		not_in_split = 'not_{}'.format(split_name)
-		split_df = self.splits[split_name]['split_df']
-		over_time = self.splitter.rolling_proportion(split_df, in_split, not_in_split, window=window)
+		over_time = self.get_proportions(split_name, windows=[window])['rolling'][window]
 		if plot:
 			over_time.plot(figsize=(10,5))
 		return over_time
 
 	def plot_cumulative_split(self, split_name, plot=True):
-		in_split = 'in_{}'.format(split_name)
-		not_in_split = 'not_{}'.format(split_name)
-		split_df = self.splits[split_name]['split_df']
-		over_time = self.splitter.cumulative_proportion(split_df, in_split, not_in_split)
+		over_time = self.get_proportions(split_name)['cumulative']
 		if plot:
 			over_time.plot(figsize=(10,5))
 		return over_time
@@ -1,3 +1,6 @@
+import numpy as np
+import pandas as pd
+
 REGION_MAP = {"Connecticut": "New England", 
               "Maine": "New England", 
               "Massachusetts": "New England", 
@@ -181,3 +184,39 @@ ALL_SPLITS = {
     'list': NON_URBAN_LIST
   } 
 }
+
+def split_categories(counties, splits=ALL_SPLITS):
+    """
+    Fixed category order for every column a split is defined on: counties from
+    the reference data, states and regions from REGION_MAP, and the union of the
+    split lists for any other column (e.g. School Metro Area).
+    """
+    categories = {
+        'county_full': pd.Index(counties['Geography']),
+        'School State': pd.Index(sorted(REGION_MAP)),
+        'region': pd.Index(sorted(set(REGION_MAP.values())))
+    }
+    extra = {}
+    for split_def in splits.values():
+        if split_def['column'] not in categories:
+            extra.setdefault(split_def['column'], set()).update(split_def['list'])
+    for column, values in extra.items():
+        categories[column] = pd.Index(sorted(values))
+    return categories
+
+def compile_split(split, categories):
+    """
+    Boolean lookup table for one split, indexed by category code. It has one
+    extra trailing False so that code -1 (value outside the categories) is
+    never in the split.
+    """
+    lookup = np.zeros(len(categories) + 1, dtype=bool)
+    lookup[:-1] = categories.isin(split)
+    return lookup
+
+def compile_splits(categories, splits=ALL_SPLITS):
+    """Compile every split into {'column': col, 'list': list, 'lookup': bool array}."""
+    return {split_name: {'column': split_def['column'],
+                         'list': split_def['list'],
+                         'lookup': compile_split(split_def['list'], categories[split_def['column']])}
+            for split_name, split_def in splits.items()}
@@ -0,0 +1,66 @@
+"""
+Lazily loaded county reference data for geo.py.
+
+The Census population CSV is only parsed once, into a compact pickle next to
+it (categorical state, int rank); later processes read that pickle on first
+use instead of paying for the CSV at import time. The pickle is keyed on the
+CSV's hash, so it is rebuilt whenever the CSV changes. The compiled split lookup
+tables are built from it on first use as well.
+"""
+import hashlib
+import os
+from functools import lru_cache
+
+import pandas as pd
+
+from .geo_mappings import ALL_SPLITS, split_categories, compile_splits
+
+GEO_DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+COUNTIES_CSV_PATH = os.path.join(GEO_DATA_DIR, 'PEP_2016_PEPANNRES_with_ann.csv')
+COUNTIES_CACHE_PATH = os.path.join(GEO_DATA_DIR, 'counties.pkl')
+
+POPULATION_COL = 'Population Estimate (as of July 1) - 2016'
+
+def source_key(csv_path=COUNTIES_CSV_PATH):
+    """SHA-1 of the CSV's contents, which the pickle is keyed on."""
+    with open(csv_path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def build_counties(csv_path=COUNTIES_CSV_PATH, cache_path=COUNTIES_CACHE_PATH):
+    """Parse the Census CSV into the compact counties frame, writing it (and the CSV's key) to cache_path."""
+    counties = pd.read_csv(csv_path, skiprows=1, encoding='ISO-8859-1',
+                           usecols=['Geography', POPULATION_COL])
+    counties['rank'] = counties[POPULATION_COL].rank(ascending=False, method='min').astype(int)
+    counties['state'] = counties['Geography'].str.split(', ', expand=True)[1].astype('category')
+    if cache_path:
+        pd.to_pickle({'source': source_key(csv_path), 'counties': counties}, cache_path)
+    return counties
+
+@lru_cache(maxsize=1)
+def get_counties():
+    """Counties reference frame (Geography, population, rank, state), loaded on first use."""
+    if os.path.exists(COUNTIES_CACHE_PATH):
+        cached = pd.read_pickle(COUNTIES_CACHE_PATH)
+        if isinstance(cached, dict) and cached.get('source') == source_key(COUNTIES_CSV_PATH):
+            return cached['counties']
+    return build_counties(COUNTIES_CSV_PATH, COUNTIES_CACHE_PATH)
+
+@lru_cache(maxsize=1)
+def get_counties_by_state():
+    """Index of state -> list of county names, used to narrow fuzzy matching."""
+    counties = get_counties()
+    return {state: group['Geography'].tolist()
+            for state, group in counties.groupby('state') if len(group)}
+
+@lru_cache(maxsize=1)
+def get_compiled_splits():
+    """
+    (categories, compiled) for ALL_SPLITS: the category order of each split
+    column, and each split as a boolean lookup table over those codes.
+    """
+    categories = split_categories(get_counties(), ALL_SPLITS)
+    return categories, compile_splits(categories, ALL_SPLITS)
+
+if __name__ == '__main__':
+    # Pre-build the pickle, e.g. as part of a deploy: python -m lib.geo_data.reference
+    build_counties()
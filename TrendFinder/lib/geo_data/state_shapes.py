@@ -0,0 +1,193 @@
+"""
+Simplified, pre-projected state outlines for a dashboard choropleth.
+
+Reads the cb_2016_us_state_5m shapefile that ships in geo_data (without a GIS
+dependency), projects it to an Albers equal-area layout with Alaska and
+Hawaii inset below the lower 48 (as in d3's albersUsa), simplifies each ring
+with Douglas-Peucker and writes compact GeoJSON. Holes stay with the polygon
+they're cut out of.
+
+The coordinates are projected kilometres (x east, y north of the lower 48's
+centre), not lon/lat: draw them on a plain cartesian plot (or a geo with an
+identity projection), not as lon/lat on a map.
+"""
+import json
+import os
+import struct
+
+import numpy as np
+
+from .geo_mappings import REGION_MAP
+from .reference import GEO_DATA_DIR
+
+STATE_SHAPES_PATH = os.path.join(GEO_DATA_DIR, 'cb_2016_us_state_5m', 'cb_2016_us_state_5m')
+STATE_GEOMETRY_PATH = os.path.join(GEO_DATA_DIR, 'state_geometry.json')
+
+EARTH_RADIUS_KM = 6371.0
+# (lon0, lat0, standard parallels, scale, offset in km from the lower 48 centre)
+LOWER_48 = (-96.0, 38.7, (29.5, 45.5), 1.0, (0.0, 0.0))
+INSETS = {
+    'Alaska': (-156.0, 58.5, (55.0, 65.0), 0.35, (-0.307 * EARTH_RADIUS_KM, -0.201 * EARTH_RADIUS_KM)),
+    'Hawaii': (-160.0, 19.9, (8.0, 18.0), 1.0, (-0.205 * EARTH_RADIUS_KM, -0.212 * EARTH_RADIUS_KM))
+}
+
+def read_dbf(path):
+    """Records of a dBase file as a list of dicts of stripped strings."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    n_records, header_len, record_len = struct.unpack('<IHH', data[4:12])
+    fields = []
+    pos = 32
+    while data[pos] != 0x0D:
+        name = data[pos:pos + 11].split(b'\0')[0].decode('ascii')
+        fields.append((name, data[pos + 16]))
+        pos += 32
+    records = []
+    for i in range(n_records):
+        pos = header_len + i * record_len + 1 # skip deletion flag
+        record = {}
+        for name, length in fields:
+            record[name] = data[pos:pos + length].decode('utf-8').strip()
+            pos += length
+        records.append(record)
+    return records
+
+def read_shp(path):
+    """Polygon records of a shapefile, each a list of (n, 2) lon/lat ring arrays."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    shapes = []
+    pos = 100
+    while pos < len(data):
+        content_len = struct.unpack('>i', data[pos + 4:pos + 8])[0] * 2
+        content = pos + 8
+        shape_type = struct.unpack('<i', data[content:content + 4])[0]
+        rings = []
+        if shape_type == 5:
+            n_parts, n_points = struct.unpack('<ii', data[content + 36:content + 44])
+            parts = np.frombuffer(data, dtype='<i4', count=n_parts, offset=content + 44)
+            points = np.frombuffer(data, dtype='<f8', count=2 * n_points,
+                                   offset=content + 44 + 4 * n_parts).reshape(-1, 2)
+            bounds = list(parts) + [n_points]
+            rings = [points[bounds[i]:bounds[i + 1]] for i in range(n_parts)]
+        shapes.append(rings)
+        pos = content + content_len
+    return shapes
+
+def albers(lon, lat, lon0, lat0, parallels):
+    """Spherical Albers equal-area conic, in km, with (lon0, lat0) at the origin."""
+    phi1, phi2 = np.radians(parallels)
+    n = (np.sin(phi1) + np.sin(phi2)) / 2
+    c = np.cos(phi1) ** 2 + 2 * n * np.sin(phi1)
+    rho = EARTH_RADIUS_KM * np.sqrt(c - 2 * n * np.sin(np.radians(lat))) / n
+    rho0 = EARTH_RADIUS_KM * np.sqrt(c - 2 * n * np.sin(np.radians(lat0))) / n
+    theta = n * np.radians(lon - lon0)
+    return np.column_stack([rho * np.sin(theta), rho0 - rho * np.cos(theta)])
+
+def project_ring(ring, state):
+    lon0, lat0, parallels, scale, offset = INSETS.get(state, LOWER_48)
+    lon = ring[:, 0]
+    if state == 'Alaska':
+        # the Aleutians cross the antimeridian
+        lon = np.where(lon > 0, lon - 360, lon)
+    return albers(lon, ring[:, 1], lon0, lat0, parallels) * scale + offset
+
+def ring_area(ring):
+    """Signed (shoelace) area of a ring: negative if clockwise, as outer rings are in shapefiles."""
+    x, y = ring[:, 0], ring[:, 1]
+    return (np.dot(x[:-1], y[1:]) - np.dot(x[1:], y[:-1])) / 2
+
+def contains(ring, point):
+    """Whether point is inside ring (even-odd ray casting)."""
+    x, y = ring[:, 0], ring[:, 1]
+    x0, y0, x1, y1 = x[:-1], y[:-1], x[1:], y[1:]
+    crosses = (y0 > point[1]) != (y1 > point[1])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        at = x0 + (point[1] - y0) * (x1 - x0) / (y1 - y0)
+    return bool(np.count_nonzero(crosses & (point[0] < at)) % 2)
+
+def group_rings(rings):
+    """
+    Polygons of a shapefile record's rings, each [outer ring, holes...]: outer
+    rings are clockwise, and each hole (counter-clockwise) goes with the
+    smallest outer ring that contains it.
+    """
+    areas = [ring_area(ring) for ring in rings]
+    outers = [i for i, area in enumerate(areas) if area <= 0]
+    polygons = {i: [rings[i]] for i in outers}
+    for i, area in enumerate(areas):
+        if area <= 0:
+            continue
+        around = [j for j in outers if contains(rings[j], rings[i][0])]
+        if around:
+            polygons[min(around, key=lambda j: -areas[j])].append(rings[i])
+    return [polygons[i] for i in outers]
+
+def simplify_ring(points, tolerance):
+    """Douglas-Peucker simplification of a closed ring, keeping its endpoints."""
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = points[end] - points[start]
+        offsets = points[start + 1:end] - points[start]
+        length = np.hypot(segment[0], segment[1])
+        if length == 0:
+            dist = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            dist = np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]) / length
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            keep[start + 1 + i] = True
+            stack.append((start, start + 1 + i))
+            stack.append((start + 1 + i, end))
+    return points[keep]
+
+def build_state_geometry(path=STATE_GEOMETRY_PATH, tolerance=5.0, shapes_path=STATE_SHAPES_PATH):
+    """
+    GeoJSON FeatureCollection of the states in REGION_MAP, projected (km) and
+    simplified to tolerance km, one polygon per outer ring with its holes.
+    Rings that collapse below a triangle are dropped, except a state's largest
+    outer ring. Written to path if given.
+    """
+    records = read_dbf(shapes_path + '.dbf')
+    shapes = read_shp(shapes_path + '.shp')
+    features = []
+    for record, rings in zip(records, shapes):
+        state = record['NAME']
+        if state not in REGION_MAP:
+            continue
+        grouped = group_rings([project_ring(ring, state) for ring in rings])
+        largest = int(np.argmax([len(polygon[0]) for polygon in grouped]))
+        polygons = []
+        for i, polygon in enumerate(grouped):
+            simplified = [simplify_ring(ring, tolerance) for ring in polygon]
+            if len(simplified[0]) < 4 and i != largest:
+                continue
+            holes = [hole for hole in simplified[1:] if len(hole) >= 4]
+            polygons.append([np.round(ring, 1).tolist() for ring in [simplified[0]] + holes])
+        features.append({'type': 'Feature',
+                         'id': record['STUSPS'],
+                         'properties': {'name': state,
+                                        'abbr': record['STUSPS'],
+                                        'region': REGION_MAP[state]},
+                         'geometry': {'type': 'MultiPolygon', 'coordinates': polygons}})
+    geometry = {'type': 'FeatureCollection', 'features': features}
+    if path:
+        with open(path, 'w') as f:
+            json.dump(geometry, f, separators=(',', ':'))
+    return geometry
+
+def get_state_geometry(path=STATE_GEOMETRY_PATH):
+    """Pre-built state geometry, building it on first use."""
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return build_state_geometry(path)
+
+if __name__ == '__main__':
+    # Rebuild state_geometry.json: python -m lib.geo_data.state_shapes
+    build_state_geometry()
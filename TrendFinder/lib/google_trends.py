@@ -0,0 +1,122 @@
+"""
+Google Trends interest over time for demo.ggl_trends.
+
+A provider returns interest over time for a list of keywords, one column per
+keyword scaled to its own maximum of 100, and leaves out keywords Google has
+too little data for. PytrendsProvider asks Google through pytrends (up to 5
+keywords per payload, and alone for those the payload leaves too coarse),
+CachedProvider keeps any provider's results on disk by keyword, timeframe and
+geo, and FixtureProvider serves them from a local CSV so the pipeline can run
+without network.
+"""
+import hashlib
+import os
+import time
+
+import pandas as pd
+
+# Most keywords Google Trends compares in one payload
+MAX_KEYWORDS = 5
+# A payload scales every keyword to its largest one, in integers: keywords
+# peaking below this within their payload are requested again on their own
+MIN_PEAK = 25
+
+def rescale(trends):
+    """Each column scaled to its own maximum of 100; all-zero columns are dropped."""
+    trends = trends.astype(float)
+    maxima = trends.max()
+    keep = maxima[maxima > 0].index
+    return trends[keep] * 100 / maxima[keep]
+
+class TrendsProvider(object):
+    def interest_over_time(self, keywords, timeframe='all', geo='US'):
+        """Frame of interest over time (date index), one column per keyword with data."""
+        raise NotImplementedError
+
+class PytrendsProvider(TrendsProvider):
+    """
+    Live Google Trends via pytrends, batching keywords MAX_KEYWORDS at a time.
+    Keywords that come back all zero or peaking below MIN_PEAK (swamped by a
+    more popular keyword in the payload) are requested again one at a time,
+    as rescaling them cannot restore the lost resolution.
+    """
+    def __init__(self, hl='en-US', tz=360, pause=1.0):
+        self.hl = hl
+        self.tz = tz
+        self.pause = pause # seconds between payloads, to stay under the rate limit
+        self.client = None
+
+    def fetch(self, keywords, timeframe, geo):
+        """One payload's interest over time (scaled within the payload)."""
+        if self.client is None:
+            from pytrends.request import TrendReq
+            self.client = TrendReq(hl=self.hl, tz=self.tz)
+        self.client.build_payload(keywords, cat=0, timeframe=timeframe, geo=geo, gprop='')
+        return self.client.interest_over_time().drop(columns=['isPartial'], errors='ignore')
+
+    def interest_over_time(self, keywords, timeframe='all', geo='US'):
+        payloads = [keywords[i:i + MAX_KEYWORDS] for i in range(0, len(keywords), MAX_KEYWORDS)]
+        batches = []
+        while payloads:
+            payload = payloads.pop(0)
+            batch = self.fetch(payload, timeframe, geo)
+            if len(payload) > 1:
+                peaks = batch.max() if not batch.empty else pd.Series()
+                coarse = [kw for kw in payload if not peaks.get(kw, 0) >= MIN_PEAK]
+                # asked for alone rather than rescaled from a few levels
+                payloads.extend([kw] for kw in coarse)
+                batch = batch.drop(columns=coarse, errors='ignore')
+            if not batch.empty:
+                # scaled within the payload, so rescale each keyword on its own
+                batches.append(rescale(batch))
+            if payloads:
+                time.sleep(self.pause)
+        if not batches:
+            return pd.DataFrame()
+        return pd.concat(batches, axis=1)
+
+class FixtureProvider(TrendsProvider):
+    """Interest over time from a local CSV (first column the dates, one column per keyword) or frame."""
+    def __init__(self, fixture):
+        if not isinstance(fixture, pd.DataFrame):
+            fixture = pd.read_csv(fixture, index_col=0, parse_dates=True)
+        self.fixture = fixture
+
+    def interest_over_time(self, keywords, timeframe='all', geo='US'):
+        return self.fixture[[kw for kw in keywords if kw in self.fixture.columns]]
+
+class CachedProvider(TrendsProvider):
+    """
+    Keeps each keyword's results from provider as a pickle in cache_dir, keyed
+    by keyword, timeframe and geo. Keywords without data are not cached, so
+    they are asked for again next time. Results older than max_age days (if
+    given) are fetched again.
+    """
+    def __init__(self, provider, cache_dir, max_age=None):
+        self.provider = provider
+        self.cache_dir = cache_dir
+        self.max_age = max_age
+
+    def path(self, keyword, timeframe, geo):
+        key = '\t'.join([keyword, timeframe, geo]).encode('utf-8')
+        return os.path.join(self.cache_dir, hashlib.sha1(key).hexdigest() + '.pkl')
+
+    def is_fresh(self, path):
+        if not os.path.exists(path):
+            return False
+        return self.max_age is None or time.time() - os.path.getmtime(path) < self.max_age * 86400
+
+    def interest_over_time(self, keywords, timeframe='all', geo='US'):
+        missing = [kw for kw in keywords if not self.is_fresh(self.path(kw, timeframe, geo))]
+        if missing:
+            fetched = self.provider.interest_over_time(missing, timeframe=timeframe, geo=geo)
+            if not os.path.exists(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            for kw in missing:
+                if kw in fetched.columns:
+                    fetched[kw].to_pickle(self.path(kw, timeframe, geo))
+        paths = [(kw, self.path(kw, timeframe, geo)) for kw in keywords]
+        columns = [pd.read_pickle(path).rename(kw) for kw, path in paths if os.path.exists(path)]
+        if not columns:
+            return pd.DataFrame()
+        return pd.concat(columns, axis=1)
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 
 # Needs to be changed later?
@@ -42,4 +43,32 @@ def format_current_trends(current_trends):
             # round
             current_trends_table[col] = current_trends_table[col].apply(lambda x: "{:.2f}".format(x))
             
-    return current_trends_table
\ No newline at end of file
+    return current_trends_table
+
+def time_bins(dates, freq):
+    """
+    Bin code of each date under pd.Grouper(freq=freq), plus the bins' labels.
+
+    Labels are exactly those of a groupby with the same Grouper (empty bins
+    included), so per-bin sums can be computed from the codes with bincount or
+    a sparse product and line up with a groupby result. NaT dates get code -1.
+    """
+    dates = pd.DatetimeIndex(dates)
+    valid = np.flatnonzero(~dates.isna())
+    order = valid[np.argsort(dates.values[valid], kind='mergesort')]
+    sizes = pd.Series(1, index=dates[order]).groupby(pd.Grouper(freq=freq)).size()
+    codes = np.full(len(dates), -1, dtype=np.int64)
+    # sorted dates fill the bins in label order
+    codes[order] = np.repeat(np.arange(len(sizes)), sizes.values)
+    return codes, sizes.index
+
+def rolling_sums(values, window):
+    """
+    Sums of each run of window consecutive rows of values (NaN until the first
+    full window, like .rolling(window).sum()), from a single cumulative sum.
+    """
+    values = np.asarray(values, dtype=float)
+    cumsum = np.cumsum(np.concatenate([np.zeros((1,) + values.shape[1:]), values]), axis=0)
+    sums = np.full(values.shape, np.nan)
+    sums[window - 1:] = cumsum[window:] - cumsum[:len(cumsum) - window]
+    return sums
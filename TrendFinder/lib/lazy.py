@@ -0,0 +1,27 @@
+"""
+Deferred imports for the plotting and notebook dependencies of lib.
+
+The pipeline (main.py) runs headless and only builds plot configs, so
+plotly, matplotlib and the nltk corpora shouldn't be loaded when lib's
+modules are imported. lazy_import gives a stand-in that imports the real
+module on first attribute access, i.e. only once a plot=True path (or
+anything else that needs it) actually runs.
+"""
+import importlib
+import sys
+
+class LazyModule(object):
+    """Stand-in for the module called name, imported on first attribute access."""
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+def lazy_import(name):
+    """LazyModule of name, or the module itself if it is already imported."""
+    module = sys.modules.get(name)
+    return module if module is not None else LazyModule(name)
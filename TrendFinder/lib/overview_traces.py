@@ -3,21 +3,56 @@ import os
 
 import pandas as pd
 import numpy as np
-import plotly.plotly as py
-import plotly.graph_objs as go
-from plotly.offline import download_plotlyjs, init_notebook_mode, plot, iplot
 
 from lib import plot_formatters as pf
+from lib.helpers import time_bins
+from lib.features import bin_sums
+from lib.lazy import lazy_import
 
-init_notebook_mode(connected=True)
+offline = lazy_import('plotly.offline')
+_notebook_mode = False
+
+# Overview dimension --> projects column
+OVERVIEW_DIMENSIONS = [('metro', 'School Metro Area'), ('income', 'School Poverty Level'),
+                       ('subject', 'Project Subject Category'), ('grade', 'Project Grade Level')]
+COLORS = {
+    'metro': ['#194769','#A0C1B8', '#E4D183', '#F2855E'],
+    'income': ['rgb(0, 0, 102)', 'rgb(127, 166, 238)'],
+    'subject': ['#84B9EF','#FBE4C9', '#FF5D5D', '#952E4B' , '#FFFF9D', '#F38181', '#F12D2D', '#660000' ],
+    'grade': ['#FDA403','#FFD6A0', '#404B69', '#7FA99B']
+}
+# Subjects with less than this share of all projects are bucketed into 'Other'
+OTHER_SHARE = .05
+
+def iplot(fig, **kwargs):
+    """plotly.offline.iplot, starting the notebook mode on the first plot."""
+    global _notebook_mode
+    if not _notebook_mode:
+        offline.init_notebook_mode(connected=True)
+        _notebook_mode = True
+    offline.iplot(fig, **kwargs)
 
 def bar_switch(df):
     #function for creating percent bars, rather than volume
-    df['sum_col'] = df.sum(axis=1)
-    df = df.apply(lambda x: x/df['sum_col']*100, axis=0)
-    df = df.drop('sum_col', axis=1)
-    df = df.round(1)
-    return df
+    return percent_tables([df])[0]
+
+def percent_tables(tables):
+    """
+    bar_switch of every frame in tables (each row as percentages of its sum,
+    rounded to 1 decimal) as one NumPy operation over all their rows.
+    """
+    if not tables:
+        return []
+    # rows are independent, so pad to a common width and stack them
+    width = max(table.shape[1] for table in tables)
+    values = np.zeros((sum(len(table) for table in tables), width))
+    bounds = np.cumsum([0] + [len(table) for table in tables])
+    for table, start in zip(tables, bounds):
+        values[start:start + len(table), :table.shape[1]] = table.values
+    with np.errstate(invalid='ignore', divide='ignore'):
+        values = np.round(values / values.sum(axis=1, keepdims=True) * 100, 1)
+    return [pd.DataFrame(values[start:end, :table.shape[1]], index=table.index, columns=table.columns)
+            for table, start, end in zip(tables, bounds[:-1], bounds[1:])]
 
 def create_title(s):
     #creates titles for graphs
@@ -27,48 +62,155 @@ def create_title(s):
 
 def cutoff(df):
     #cuts dataframe to only include time when 3% of all projects made
-    percent = df.cum_sum.iloc[-1]*.03
-    threshold = df.loc[(df['cum_sum']) > percent]
-    t_loc = threshold.iloc[0].name
-    df_final = df.iloc[df.index.get_loc(t_loc):]
-    return df_final
+    return df.iloc[cutoff_starts([df['cum_sum'].values])[0]:]
+
+def cutoff_starts(cum_sums, share=.03):
+    """
+    Position of the first value above share of the last one in each of the
+    non-decreasing arrays cum_sums, from a single searchsorted: each array is
+    shifted above the previous one, so their concatenation stays sorted.
+    """
+    lengths = np.array([len(cum_sum) for cum_sum in cum_sums])
+    lasts = np.array([cum_sum[-1] if len(cum_sum) else 0 for cum_sum in cum_sums], dtype=float)
+    shifts = np.cumsum(np.concatenate([[0], lasts[:-1] + 1]))
+    starts = np.cumsum(np.concatenate([[0], lengths[:-1]]))
+    flat = np.concatenate([np.asarray(cum_sum, dtype=float) + shift for cum_sum, shift in zip(cum_sums, shifts)])
+    return np.searchsorted(flat, lasts * share + shifts, side='right') - starts
 
 def grade_analyses(df):
     #does analysis for grade data
-    column_grouped = df.groupby(['Project Grade Level', pd.Grouper(key = 'Project Posted Date', freq = 'M')]).size().to_frame('freq').reset_index()
-    # Outputs pivot table of count by time period per grade level (grade level as columns)
-    column_pivoted = column_grouped.pivot(index= 'Project Posted Date', columns='Project Grade Level', values ='freq').fillna(value = 0)
-    # Calculate cumulative sum
-    column_pivoted['cum_sum'] = column_pivoted.sum(axis=1).cumsum()
-    return column_pivoted
+    return with_cum_sum(overview_counts(df, ['Project Grade Level'])['Project Grade Level'])
 
 def income_analyses(df):
     #does analysis for income data
-    column_grouped = df.groupby(['School Poverty Level', pd.Grouper(key = 'Project Posted Date', freq = 'M')]).size().to_frame('freq').reset_index()
-    column_pivoted = column_grouped.pivot(index= 'Project Posted Date', columns='School Poverty Level', values ='freq').fillna(value = 0)
-    column_pivoted['cum_sum'] = column_pivoted.sum(axis=1).cumsum()
-    return column_pivoted
+    return with_cum_sum(overview_counts(df, ['School Poverty Level'])['School Poverty Level'])
 
 def subject_analyses(df):
     #does analysis for subject data
-    column_grouped = df.groupby(['Project Subject Category', pd.Grouper(key = 'Project Posted Date', freq = 'M')]).size().to_frame('freq').reset_index()
-    column_pivoted = column_grouped.pivot(index= 'Project Posted Date', columns='Project Subject Category', values ='freq').fillna(value = 0)
-    column_pivoted['cum_sum'] = column_pivoted.sum(axis=1).cumsum()
-    return column_pivoted
+    return with_cum_sum(overview_counts(df, ['Project Subject Category'])['Project Subject Category'])
 
 def metro_analyses(df):
     #does analysis for metro data
-    column_grouped = df.groupby(['School Metro Area', pd.Grouper(key = 'Project Posted Date', freq = 'M')]).size().to_frame('freq').reset_index()
-    column_pivoted = column_grouped.pivot(index= 'Project Posted Date', columns='School Metro Area', values ='freq').fillna(value = 0)
-    column_pivoted['cum_sum'] = column_pivoted.sum(axis=1).cumsum()
-    return column_pivoted
+    return with_cum_sum(overview_counts(df, ['School Metro Area'])['School Metro Area'])
+
+def overview_counts(df, columns=[column for _, column in OVERVIEW_DIMENSIONS], date_col='Project Posted Date'):
+    """
+    Monthly project counts per value of each of columns, from one pass over
+    category codes: a dict of column --> (month x value) frame, like the
+    groupby([column, Grouper(freq='M')]).size() pivots it replaces (months
+    without any value are left out).
+    """
+    month_codes, months = time_bins(df[date_col], 'M')
+    counts = {}
+    for column in columns:
+        codes, values = pd.factorize(df[column], sort=True)
+        valid = (codes >= 0) & (month_codes >= 0)
+        flat = np.bincount(month_codes[valid] * len(values) + codes[valid], minlength=len(months) * len(values))
+        table = flat.reshape(len(months), len(values))
+        present = table.sum(axis=1) > 0
+        table = table[present]
+        if (table == 0).any():
+            # missing pairs were NaN in the pivot, filled with 0 as floats
+            table = table.astype(float)
+        table = pd.DataFrame(table, index=months[present], columns=pd.Index(np.asarray(values), name=column))
+        table.index.name = date_col
+        counts[column] = table
+    return counts
+
+def overview_cube(df, keywords, columns=[column for _, column in OVERVIEW_DIMENSIONS],
+                  date_col='Project Posted Date'):
+    """
+    overview_counts of the projects of every keyword at once, from keywords, a
+    (project x keyword) FeatureMatrix of df's rows (see
+    features.keyword_matrix_from_ids): {keyword: {column: (month x value) frame}}.
+
+    The months and values are coded once over all of df, and each column's
+    (keyword x month x value) counts come from a single sparse product of the
+    keyword membership with those codes, rather than from a scan of df per
+    keyword. Each keyword's tables are then trimmed to its own months and values.
+    """
+    month_codes, months = time_bins(df[date_col], 'M')
+    counts = {keyword: {} for keyword in keywords.columns}
+    for column in columns:
+        codes, values = pd.factorize(df[column], sort=True)
+        cells = np.where((codes >= 0) & (month_codes >= 0), month_codes * len(values) + codes, -1)
+        # (keyword x (month, value)) counts, as the grouping of the projects by cell
+        cube = bin_sums(cells, len(months) * len(values), keywords.matrix).T
+        cube = np.rint(cube).astype(np.int64).reshape(len(keywords.columns), len(months), len(values))
+        for keyword, table in zip(keywords.columns, cube):
+            present = table.sum(axis=1) > 0
+            used = table.sum(axis=0) > 0
+            table = table[present][:, used]
+            if (table == 0).any():
+                table = table.astype(float)
+            table = pd.DataFrame(table, index=months[present],
+                                 columns=pd.Index(np.asarray(values)[used], name=column))
+            table.index.name = date_col
+            counts[keyword][column] = table
+    return counts
+
+def with_cum_sum(counts):
+    """counts with the cumulative number of projects as a 'cum_sum' column."""
+    counts = counts.copy()
+    counts['cum_sum'] = counts.sum(axis=1).cumsum()
+    return counts
+
+def bucket_other(analysis_df, counts, share=OTHER_SHARE):
+    """
+    Columns of analysis_df for the values with at least share of all projects in
+    counts (largest first), and the rest summed into an 'Other' column.
+    """
+    totals = counts.sum().sort_values(ascending=False, kind='mergesort')
+    top = list(totals.index[totals >= totals.sum() * share])
+    other = [value for value in totals.index if value not in top]
+    final = analysis_df[top].copy()
+    final['Other'] = analysis_df[other].sum(axis=1)
+    return final
+
+def dimension_views(name, counts_list):
+    """
+    (plot_by_<name> frames, percent_by_<name> frames) for each of the monthly
+    counts tables in counts_list, with the cutoffs and percentages of all of
+    them computed together.
+    """
+    tables = [with_cum_sum(counts) for counts in counts_list]
+    starts = cutoff_starts([table['cum_sum'].values for table in tables])
+    volumes = [table.iloc[start:] for table, start in zip(tables, starts)]
+    if name == 'subject':
+        volumes = [bucket_other(volume, counts) for volume, counts in zip(volumes, counts_list)]
+        return volumes, percent_tables(volumes)
+    return volumes, percent_tables([volume.drop('cum_sum', axis=1) for volume in volumes])
+
+def overview_views(name, counts):
+    """(plot_by_<name> frame, percent_by_<name> frame) from the monthly counts of that dimension."""
+    volumes, percents = dimension_views(name, [counts])
+    return volumes[0], percents[0]
+
+def overview_configs_all(counts_by_trend):
+    """
+    overview_configs of every trend, from {trend: overview_counts of its projects},
+    with each view computed for all trends at once: {trend: {plot name: plot_config}}.
+    """
+    trends = list(counts_by_trend)
+    configs = {trend: {} for trend in trends}
+    for name, column in OVERVIEW_DIMENSIONS:
+        volumes, percents = dimension_views(name, [counts_by_trend[trend][column] for trend in trends])
+        for trend, volume, percent in zip(trends, volumes, percents):
+            configs[trend]['plot_by_' + name] = {'kwargs': {'colors': COLORS[name]}, 'df': volume}
+            configs[trend]['percent_by_' + name] = {'kwargs': {'colors': COLORS[name]}, 'df': percent}
+    return configs
+
+def overview_configs(df):
+    """
+    plot_config of every plot_by_* and percent_by_* view of df, keyed by plot
+    name ('plot_by_metro', 'percent_by_metro', ...), from a single overview_counts.
+    """
+    return overview_configs_all({None: overview_counts(df)})[None]
 
 def percent_by_subject(df, trend_name, plot=True):
     #generates graph for subject percentages
-    analysis_df = cutoff(subject_analyses(df))
-    df = edit_cols(df, analysis_df)
-    df = bar_switch(df)
-    colors = ['#84B9EF','#FBE4C9', '#FF5D5D', '#952E4B' , '#FFFF9D', '#F38181', '#F12D2D', '#660000' ]
+    df = overview_views('subject', overview_counts(df, ['Project Subject Category'])['Project Subject Category'])[1]
+    colors = COLORS['subject']
     plot_config = {'kwargs': {'colors': colors}, 
                    'df': df}
     if not plot:
@@ -82,7 +224,7 @@ def percent_by_grade(df, trend_name, plot=True):
     df = cutoff(grade_analyses(df))
     df = df.drop('cum_sum', axis=1)
     df = bar_switch(df)
-    colors = ['#FDA403','#FFD6A0', '#404B69', '#7FA99B']
+    colors = COLORS['grade']
     plot_config = {'kwargs': {'colors': colors}, 
                    'df': df}
     if not plot:
@@ -96,7 +238,7 @@ def percent_by_metro(df, trend_name, plot=True):
     df = cutoff(metro_analyses(df))
     df = df.drop('cum_sum', axis=1)
     df = bar_switch(df)
-    colors = ['#194769','#A0C1B8', '#E4D183', '#F2855E']
+    colors = COLORS['metro']
     plot_config = {'kwargs': {'colors': colors}, 
                    'df': df}
     if not plot:
@@ -110,7 +252,7 @@ def percent_by_income(df, trend_name, plot=True):
     df = cutoff(income_analyses(df))
     df = df.drop('cum_sum', axis=1)
     df = bar_switch(df)
-    colors = ['rgb(0, 0, 102)', 'rgb(127, 166, 238)']
+    colors = COLORS['income']
     plot_config = {'kwargs': {'colors': colors}, 
                    'df': df}
     if not plot:
@@ -129,7 +271,7 @@ def percent_all(df, trendname):
 def plot_by_metro(df, trend_name, plot=True):
     #generates graph for metro volume/percentages
     df = cutoff(metro_analyses(df))
-    colors = ['#194769','#A0C1B8', '#E4D183', '#F2855E']
+    colors = COLORS['metro']
     plot_config = {'kwargs': {'colors': colors}, 
                    'df': df}
     if not plot:
@@ -141,7 +283,7 @@ def plot_by_metro(df, trend_name, plot=True):
 def plot_by_grade(df, trend_name, plot=True):
     #generates graph for grade volume/percentages
     df = cutoff(grade_analyses(df))
-    colors = ['#FDA403','#FFD6A0', '#404B69', '#7FA99B']
+    colors = COLORS['grade']
     plot_config = {'kwargs': {'colors': colors}, 
                    'df': df}
     if not plot:
@@ -153,7 +295,7 @@ def plot_by_grade(df, trend_name, plot=True):
 def plot_by_income(df, trend_name, plot=True):
     #generates graph for income volume/percentages
     df = cutoff(income_analyses(df))
-    colors = ['rgb(0, 0, 102)', 'rgb(127, 166, 238)']
+    colors = COLORS['income']
     plot_config = {'kwargs': {'colors': colors}, 
                    'df': df}
     if not plot:
@@ -164,31 +306,12 @@ def plot_by_income(df, trend_name, plot=True):
 
 #returns dataframe with pertinent columns for plot_by_subject
 def edit_cols(df, analysis_df):
-    #calculating cumsum for each of the subjects
-    subj_frame = subject_analyses(df).drop('cum_sum', axis=1).cumsum().iloc[-1].to_frame('cum_sum').reset_index().sort_values(by='cum_sum', ascending=False)
-    #calculates overall sum and if a subject has more than 5 percent of the share, then it will not be grouped int other
-    c_sum = subj_frame.cumsum().cum_sum.iloc[-1]*.05
-    top_set = set(subj_frame.loc[subj_frame['cum_sum'] >= c_sum]["Project Subject Category"])
-    #set of all subjects
-    subj_set = set(subj_frame["Project Subject Category"])
-    #set of not-included subjects
-    other = list(subj_set - top_set)
-    #dataframe that compiles all others into one column
-    odf = analysis_df.filter(items=other)
-    odf['Other'] = odf.sum(axis=1)
-    only_other = odf.Other.to_frame()
-    #dataframe of all subjects over 5%
-    top_list = list(top_set)
-    top_subjs = analysis_df.filter(items=top_list)
-    #a join of top subjects and other
-    final = top_subjs.join(only_other, how='outer')
-    return final
+    return bucket_other(analysis_df, overview_counts(df, ['Project Subject Category'])['Project Subject Category'])
 
 def plot_by_subject(df, trend_name, plot=True):
     #generates graph for subject volume/percentages
-    analysis_df = cutoff(subject_analyses(df))
-    df = edit_cols(df, analysis_df)
-    colors = ['#84B9EF','#FBE4C9', '#FF5D5D', '#952E4B' , '#FFFF9D', '#F38181', '#F12D2D', '#660000' ]
+    df = overview_views('subject', overview_counts(df, ['Project Subject Category'])['Project Subject Category'])[0]
+    colors = COLORS['subject']
 
     plot_config = {'kwargs': {'colors': colors}, 
                    'df': df}
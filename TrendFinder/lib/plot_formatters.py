@@ -3,7 +3,14 @@ import os
 import re
 
 import pandas as pd
-import plotly.graph_objs as go
+
+try:
+    from lib.lazy import lazy_import
+except ImportError: # imported on its own, next to application.py (deploy lazy.py with it)
+    from lazy import lazy_import
+
+# only loaded once a figure is built, not for output_*_data
+go = lazy_import('plotly.graph_objs')
 
 # function to output plot data to s3 for use by dashboard.py
 def output_plot_data(trend, plot_out, plot_name, prefix, bucket, s3_client):
@@ -27,6 +34,11 @@ def output_table_data(trend, df, table_name, prefix, bucket, s3_client, index=Fa
     table_key = '{}/df.csv'.format(prefix)
     s3_client.put_object(Body=df.to_csv(), Bucket=bucket, Key=table_key)
 
+# function to output json data (e.g. map geometry) to s3 for use by dashboard.py
+def output_json_data(data, name, prefix, bucket, s3_client):
+    key = '{}/{}'.format(prefix, name)
+    s3_client.put_object(Body=json.dumps(data, separators=(',', ':')), Bucket=bucket, Key=key)
+
 # TrendFinder plot_xox resource
 def plot_xox(df, trend, prop=True):
     if prop:
@@ -101,13 +113,16 @@ def plot_xox(df, trend, prop=True):
 
 # Geo plot_trend_features resource 
 
-def plot_trend_features(df, trend, passed_features=[], date_cutoff=False):
+def plot_trend_features(df, trend, passed_features=[], date_cutoff=False, feature=None, compact=False):
     """
     Plots raw trend counts (or proportions) along with desired feature. 
     Has dropdown menu to select feature to plot against trend.
 
     Counts are more readable than proportions, because auto-scaling causes axes to not be aligned 
     when plotting proportions. 
+
+    feature (one of passed_features) is shown first. If compact, it is the only
+    feature trace and there is no dropdown (see compact_index).
     """
     trace_trend = go.Scatter(x=df.index,
                             y=df[trend],
@@ -117,7 +132,8 @@ def plot_trend_features(df, trend, passed_features=[], date_cutoff=False):
                             )
 
     data = [trace_trend]
-    visible_boolean = ([False] * len(passed_features))
+    shown = ([feature] if feature in passed_features else []) if compact else passed_features
+    visible_boolean = ([False] * len(shown))
 
     tmp_button_dict = dict(label = 'None',
                          method = 'update',
@@ -129,17 +145,17 @@ def plot_trend_features(df, trend, passed_features=[], date_cutoff=False):
 
     buttons_list = [tmp_button_dict]
 
-    for i, feat in enumerate(passed_features):
+    for i, feat in enumerate(shown):
         tmp_trace_feat = go.Scatter(x=df.index,
                                 y=df[feat],
                                     name=feat,
-                                    visible=False,
+                                    visible=feat == feature,
                                     line=dict(color='#F06A6A'),
                                 yaxis='y2'
                                    )
         data.append(tmp_trace_feat)
 
-        visible_boolean = ([False] * len(passed_features))
+        visible_boolean = ([False] * len(shown))
         visible_boolean[i] = True
 
         tmp_button_dict = dict(label = feat,
@@ -152,8 +168,9 @@ def plot_trend_features(df, trend, passed_features=[], date_cutoff=False):
 
         buttons_list.append(tmp_button_dict)
 
+    active = shown.index(feature) + 1 if feature in shown else -1
     updatemenus = list([
-        dict(active=-1,
+        dict(active=active,
              buttons=list(buttons_list),
              direction = 'down',
                 pad = {'r': 10, 't': 10},
@@ -182,7 +199,13 @@ def plot_trend_features(df, trend, passed_features=[], date_cutoff=False):
             }]
     else:
         shapes = []
-    layout = dict(title='Feature Correlator for "{}" Projects'.format(trend), 
+    if compact:
+        updatemenus = []
+    if feature in shown:
+        title = 'Correlating "{}" Projects with {}'.format(trend, feature)
+    else:
+        title = 'Feature Correlator for "{}" Projects'.format(trend)
+    layout = dict(title=title, 
                 showlegend=False,
                 updatemenus=updatemenus,
                 xaxis=dict(
@@ -494,11 +517,29 @@ def percent_by_subject(df, trend, colors):
     fig = go.Figure(data=data, layout=layout)
     return fig
 
-def plot_splits(df, trend, split_names, line_pos_dict, solo_split=None): #ADD line_pos_dict
+def active_option(options, selected):
+    """Position of selected in options, 0 if it isn't one of them."""
+    return options.index(selected) if selected in options else 0
+
+def compact_index(plot_kwargs):
+    """
+    Options (split names or features) of a figure built from plot_kwargs. A
+    compact figure only holds the traces of one of them; the dashboard lists
+    the others from this index and builds each one's figure when selected.
+    """
+    return list(plot_kwargs.get('split_names', plot_kwargs.get('passed_features', [])))
+
+def plot_splits(df, trend, split_names, line_pos_dict, solo_split=None, compact=False): #ADD line_pos_dict
+	"""
+	Stacked in/not in bars of each split, with a dropdown to switch between
+	splits. If compact, only the active split's traces are included and there
+	is no dropdown.
+	"""
 	data = []
 	active = 0
 	shapes = []
-	for i, split in enumerate(split_names):
+	shown = [split_names[active_option(split_names, solo_split)]] if compact else split_names
+	for i, split in enumerate(shown):
 		data.append(go.Bar(x=df.index,
            			   y=df['in_{}'.format(split)], 
                		   base=df['bottom_{}'.format(split)],
@@ -523,8 +564,8 @@ def plot_splits(df, trend, split_names, line_pos_dict, solo_split=None): #ADD li
 	data[active*3 + 2].visible = True
 
 	buttons = []
-	for i, split in enumerate(split_names):
-		visible = ([False] * (len(split_names) * 3))
+	for i, split in enumerate(shown):
+		visible = ([False] * (len(shown) * 3))
 		visible[3*i] = True
 		visible[3*i+1] = True
 		visible[3*i+2] = True
@@ -534,13 +575,13 @@ def plot_splits(df, trend, split_names, line_pos_dict, solo_split=None): #ADD li
                       args=[dict(visible=visible),
                             dict(title='Proportion of "{}" Projects in "{}" Split'.format(trend,split))])
 		buttons.append(option)
-	if solo_split is None:
+	if solo_split is None and not compact:
 		updatemenus = [dict(active=active, showactive=True,  buttons=buttons)]
 	else:
 		updatemenus = []
 	layout = go.Layout(barmode='stack', 
                        updatemenus=updatemenus, 
-                       title='Proportion of "{}" Projects in "{}" Split'.format(trend, split_names[active]),
+                       title='Proportion of "{}" Projects in "{}" Split'.format(trend, shown[active]),
                        xaxis = {'title':'Project Posted Date'},
                        yaxis = {'title':'Proportion of Projects'},
                        font = {'family':'Futura'}
@@ -548,33 +589,31 @@ def plot_splits(df, trend, split_names, line_pos_dict, solo_split=None): #ADD li
 	fig = dict(data=data, layout=layout)
 	return fig
 
-def plot_cumulative_splits(df, trend, split_names, solo_split=None):
+def plot_cumulative_splits(df, trend, split_names, solo_split=None, compact=False):
+    active = active_option(split_names, solo_split)
+    shown = [split_names[active]] if compact else split_names
     data = []
-    active = 0
-    for i, split in enumerate(split_names):
-        data.append(go.Scatter(x=df.index, 
-                               y=df[split], 
-                               name=split, 
-                               visible=False))
-        if split == solo_split:
-            active = i
-    data[active].visible = True
+    for split in shown:
+        data.append(go.Scatter(x=df.index,
+                               y=df[split],
+                               name=split,
+                               visible=split == split_names[active]))
 
     buttons = []
-    for i, split in enumerate(split_names):
-        visible = ([False] * len(split_names))
+    for i, split in enumerate(shown):
+        visible = ([False] * len(shown))
         visible[i] = True
-        option = dict(label=split, 
+        option = dict(label=split,
                       method='update',
                       args=[dict(visible=visible),
                             dict(title='Cumulative Proportion of "{}" Projects in "{}" Split'.format(trend, split))])
         buttons.append(option)
-    if solo_split is None:
+    if solo_split is None and not compact:
         updatemenus = [dict(active=active, buttons=buttons)]
     else:
         updatemenus = []
 
-    layout = go.Layout(title='Cumulative Proportion of "{}" Projects in "{}" Split'.format(trend, split_names[active]), 
+    layout = go.Layout(title='Cumulative Proportion of "{}" Projects in "{}" Split'.format(trend, split_names[active]),
                        updatemenus=updatemenus,
                        xaxis = {'title':'Project Posted Date'},
                        yaxis = {'title':'Proportion of Projects'},
@@ -582,44 +621,47 @@ def plot_cumulative_splits(df, trend, split_names, solo_split=None):
     fig = dict(data=data, layout=layout)
     return fig
 
-def plot_rolling_splits(df, trend, window, split_names, solo_split=None):
+def plot_rolling_splits(df, trend, window, split_names, solo_split=None, compact=False):
     windows = {
+        "2W": "2 weeks",
+        "1M": "1 month",
+        "3M": "3 months",
+        "6M": "6 months",
+        "1Y": "1 year",
+        # bin counts used by artifacts written before windows were calendar units
         2: "1 month",
         6: "3 months",
         13: "6 months",
         26: "1 year"
     }
-    
+
+    active = active_option(split_names, solo_split)
+    shown = [split_names[active]] if compact else split_names
     data = []
-    active = 0
-    for i, split in enumerate(split_names):
-        data.append(go.Scatter(x=df.index, 
-                               y=df[split], 
-                               name=split, 
-                               visible=False))
-        if split == solo_split:
-            active = i
-       
-    data[active].visible = True
+    for split in shown:
+        data.append(go.Scatter(x=df.index,
+                               y=df[split],
+                               name=split,
+                               visible=split == split_names[active]))
 
     buttons = []
-    for i, split in enumerate(split_names):
-        visible = ([False] * len(split_names))
+    for i, split in enumerate(shown):
+        visible = ([False] * len(shown))
         visible[i] = True
-        option = dict(label=split, 
+        option = dict(label=split,
                       method='update',
                       args=[dict(visible=visible),
                             dict(title='Rolling Proportion ({}) of "{}" Projects in "{}" Split'.format(windows[window], trend,
                                                                                                     split))])
         buttons.append(option)
-    if solo_split is None:
+    if solo_split is None and not compact:
         updatemenus = [dict(active=active, buttons=buttons)]
     else:
         updatemenus = []
 
     layout = go.Layout(title='Rolling Proportion ({}) of "{}" Projects in "{}" Split'.format(windows[window], trend,
                                                                                           split_names[active]),
-                                                                                          
+
                        updatemenus=updatemenus,
                        xaxis = {'title':'Project Posted Date'},
                        yaxis = {'title':'Proportion of Projects'},
@@ -627,4 +669,3 @@ def plot_rolling_splits(df, trend, window, split_names, solo_split=None):
                       )
     fig = dict(data=data, layout=layout)
     return fig
-
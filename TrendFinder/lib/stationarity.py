@@ -0,0 +1,85 @@
+"""
+Batched Dickey-Fuller stationarity tests for demo.Correlator.
+
+stationarity_table runs adfuller(autolag='AIC') for every column of a frame,
+optionally spread over a process pool, and returns one row of results per
+column instead of printing them. Results are cached in-process by column name and a hash of
+its values, so feature columns (which are the same for every trend, and only
+grow by a month at a time) are only tested once.
+"""
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+RESULT_COLUMNS = ['Test Statistic', 'p-value', '#Lags Used', 'Number of Observations Used',
+                  'Critical Value (1%)', 'Critical Value (5%)', 'Critical Value (10%)']
+MAX_P_VALUE = 0.05
+# Don't start a pool for fewer untested columns than this
+MIN_PARALLEL_COLUMNS = 8
+
+_cache = {} # (column name, values hash) --> adf_result tuple
+
+def adf_result(values):
+    """adfuller(autolag='AIC') of a 1-d array, as a tuple in RESULT_COLUMNS order."""
+    # statsmodels is only loaded once a test actually runs
+    from statsmodels.tsa.stattools import adfuller
+    dftest = adfuller(values, autolag='AIC')
+    critical = dftest[4]
+    return tuple(dftest[0:4]) + (critical['1%'], critical['5%'], critical['10%'])
+
+def values_key(name, values):
+    return (name, hashlib.sha1(np.ascontiguousarray(values, dtype=float).tobytes()).hexdigest())
+
+def run_adf(series_list, processes=None):
+    """
+    adf_result of every array in series_list, in order. Serial unless processes
+    is given (0 for one per CPU), then over a process pool if worthwhile.
+
+    Only pass processes from an importable entry point: under the spawn start
+    method (macOS, Windows) every worker re-imports the __main__ module, and
+    main.py is unguarded script code.
+    """
+    if processes is None:
+        processes = 1
+    elif processes == 0:
+        processes = os.cpu_count() or 1
+    processes = min(processes, len(series_list))
+    if processes <= 1 or len(series_list) < MIN_PARALLEL_COLUMNS:
+        return [adf_result(values) for values in series_list]
+    chunksize = max(1, len(series_list) // (4 * processes))
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(adf_result, series_list, chunksize=chunksize))
+
+def stationarity_table(frame, critical_val=5, processes=None, cache_columns=None):
+    """
+    Dickey-Fuller results for each column of frame (NaNs filled with 0), one row
+    per column with the RESULT_COLUMNS and a boolean 'Passed'. A column passes if
+    its test statistic is below the critical value (default 5%) and its p-value
+    is below 0.05.
+
+    Results for cache_columns (all columns if None) are kept between calls and
+    reused whenever the same column has the same values.
+    """
+    cache_columns = set(frame.columns if cache_columns is None else cache_columns)
+    results, todo = {}, []
+    for col in frame.columns:
+        values = frame[col].fillna(0).values.astype(float)
+        key = values_key(col, values) if col in cache_columns else None
+        if key is not None and key in _cache:
+            results[col] = _cache[key]
+        else:
+            todo.append((col, key, values))
+    for (col, key, _), result in zip(todo, run_adf([values for _, _, values in todo], processes)):
+        results[col] = result
+        if key is not None:
+            _cache[key] = result
+    table = pd.DataFrame([results[col] for col in frame.columns], index=frame.columns, columns=RESULT_COLUMNS)
+    critical = table['Critical Value ({}%)'.format(critical_val)]
+    table['Passed'] = (table['Test Statistic'] <= critical) & (table['p-value'] <= MAX_P_VALUE)
+    return table
+
+def clear_cache():
+    _cache.clear()
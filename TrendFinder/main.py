@@ -1,6 +1,7 @@
 # coding: utf-8
 # Setup
 from datetime import date
+import os
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 import smtplib
@@ -8,11 +9,15 @@ import smtplib
 import pandas as pd
 import boto3
 
-from lib.helpers import subset_df_by_id, resource_formatter, project_formatter, format_current_trends
+from lib.helpers import resource_formatter, project_formatter, format_current_trends
 from lib import TrendFinder as tf
 from lib import overview_traces as ot
 from lib import demo
+from lib.feature_store import FeatureStore
+from lib.features import keyword_matrix_from_ids
+from lib.google_trends import PytrendsProvider, CachedProvider, FixtureProvider
 from lib import geo as g
+from lib.geo_data.state_shapes import get_state_geometry
 from lib import plot_formatters as pf 
 
 # Style for TrendFinder email
@@ -48,6 +53,14 @@ th {
 DATE = date.today().strftime("%Y-%m-%d")
 # Hide pandas warnings
 pd.options.mode.chained_assignment = None
+# Time grain of geographic splits: '1W', '2W', '1M' or '1Q'
+GEO_GRAIN = '2W'
+# Monthly feature series kept between daily runs (see lib/feature_store.py)
+FEATURE_STORE_PATH = "feature_store.pkl"
+# Google Trends results are cached here for GGL_TRENDS_MAX_AGE days;
+# set the GGL_TRENDS_FIXTURE environment variable to a CSV to run without network
+GGL_TRENDS_CACHE_DIR = "ggl_trends_cache"
+GGL_TRENDS_MAX_AGE = 7
 
 # Configuration
 # AWS initialization
@@ -58,34 +71,25 @@ bucket = "donorschoose-trends" # S3 bucket name
 client = boto3.client("s3")
 s3 = boto3.resource("s3")
 
+# Overview plots written for each trend
+OVERVIEW_PLOTS = ['plot_by_metro', 'plot_by_income', 'plot_by_subject', 'plot_by_grade',
+                  'percent_by_metro', 'percent_by_income', 'percent_by_subject', 'percent_by_grade']
+# Split and feature plots are drawn one split/feature at a time by the dashboard
+COMPACT_FIGURES = True
+
 # Pipeline wrapper functions
-# Overview (does subset_df at a time)
-def build_overview(word, subset_df):
-    # Counts
-    metro_plot = ot.plot_by_metro(subset_df, word, plot=False)
-    income_plot = ot.plot_by_income(subset_df, word, plot=False)
-    subject_plot = ot.plot_by_subject(subset_df, word, plot=False)
-    grade_plot = ot.plot_by_grade(subset_df, word, plot=False)
-    
-    pf.output_plot_data(word, metro_plot, 'plot_by_metro', DATE, bucket, client)
-    pf.output_plot_data(word, income_plot, 'plot_by_income', DATE, bucket, client)
-    pf.output_plot_data(word, subject_plot, 'plot_by_subject', DATE, bucket, client)
-    pf.output_plot_data(word, grade_plot, 'plot_by_grade', DATE, bucket, client)
-
-    # Proportions
-    metro_percent = ot.percent_by_metro(subset_df, word, plot=False)
-    income_percent = ot.percent_by_income(subset_df, word, plot=False)
-    subject_percent = ot.percent_by_subject(subset_df, word, plot=False)
-    grade_percent = ot.percent_by_grade(subset_df, word, plot=False)
-
-    pf.output_plot_data(word, metro_percent, 'percent_by_metro', DATE, bucket, client)
-    pf.output_plot_data(word, income_percent, 'percent_by_income', DATE, bucket, client)
-    pf.output_plot_data(word, subject_percent, 'percent_by_subject', DATE, bucket, client)
-    pf.output_plot_data(word, grade_percent, 'percent_by_grade', DATE, bucket, client)
+# Overview (does all at once, from the ot.overview_cube of all words)
+def build_overviews(overview_counts):
+    # Counts and proportions of every word, cutoffs and percentages computed together
+    overview_configs = ot.overview_configs_all(overview_counts)
+    for word, configs in overview_configs.items():
+        for plot_name in OVERVIEW_PLOTS:
+            pf.output_plot_data(word, configs[plot_name], plot_name, DATE, bucket, client)
 
 # Demographics (does all at once, depends on projects and keyword_ids_dict)
 def build_demo():
-    cor = demo.Correlator(projects)
+    store = FeatureStore.load(FEATURE_STORE_PATH)
+    cor = demo.Correlator(projects, store=store)
     cor.find_trends(keywords_dict = keyword_ids_dict)
 
     # Default time_interval = 1M
@@ -93,13 +97,23 @@ def build_demo():
     # Test stationarity assumptions
     cor.stationarize()
     cor.stationarity_test_all() # what passes this test is in .passed_trends
+    store.save()
     # Calculate correlations
     cor.compare_corrs()
+    print(cor.memory_report())
 
     # Get trends that did not pass
     # demo_not_passed = [word for word in trend_keywords if word not in cor.passed_trends]
 
-    features = [col for col in cor.df.columns if 'Bin' in col]
+    features = cor.feature_names
+    # Ratio differences for every trend at once
+    all_diffs = cor.compare_all_ratios(trend_keywords, features=features)
+    # Google Trends for every trend at once
+    if os.environ.get("GGL_TRENDS_FIXTURE"):
+        ggl_provider = FixtureProvider(os.environ["GGL_TRENDS_FIXTURE"])
+    else:
+        ggl_provider = CachedProvider(PytrendsProvider(), GGL_TRENDS_CACHE_DIR, max_age=GGL_TRENDS_MAX_AGE)
+    all_google_trends = demo.ggl_trends_all(cor.grouped, trend_keywords, ggl_provider)
 
     # Can only investigate trend features for trends that pass tests
     for word in cor.passed_trends:
@@ -107,23 +121,23 @@ def build_demo():
         top_corrs = cor.top_corrs(word)
         pf.output_table_data(word, top_corrs, "top_corrs", DATE, bucket, client, index=True)
         # Correlator
-        trend_features_out = demo.plot_trend_features(cor.grouped, trend=word, passed_features = cor.passed_features, date_cutoff=trend_finder.current_start, plot=False)
+        trend_features_out = demo.plot_trend_features(cor.grouped, trend=word, passed_features = cor.passed_features, date_cutoff=trend_finder.current_start, plot=False, compact=COMPACT_FIGURES)
         pf.output_plot_data(word, trend_features_out, 'plot_trend_features', DATE, bucket, client)
         
     for word in trend_keywords:
         # Ratios
-        diffs = demo.compare_ratios(cor.df, cor.grouped, trend=word, features=features)
+        diffs = all_diffs[word]
         diffs_out = demo.plot_diffs(diffs, feat_type=['Poverty', 'Metro', 'Grade', 'Various'], plot=False)
         pf.output_plot_data(word, diffs_out, 'plot_diffs', DATE, bucket, client)
 
         # Google Trends
-        google_trends = demo.ggl_trends(cor.grouped, word)
+        google_trends = all_google_trends[word]
         ggl_trends_out = demo.plot_ggl_trends(google_trends, word, plot=False)
         pf.output_plot_data(word, ggl_trends_out, 'plot_ggl_trends', DATE, bucket, client)
 
 # Geo (does subset_df at a time)
 def build_geo(word, subset_df):
-    geo = g.GeoMeta(subset_df)
+    geo = g.GeoMeta(subset_df, grain=GEO_GRAIN)
     
     # Build all splits
     geo.get_all_splits()
@@ -132,19 +146,25 @@ def build_geo(word, subset_df):
     pf.output_table_data(word, trendiest, "geo_splits", DATE, bucket, client, index=True)
     
     # Plot split vs. non-split over time
-    plot_splits_out = geo.plot_splits(word, plot=False)
+    plot_splits_out = geo.plot_splits(word, plot=False, compact=COMPACT_FIGURES)
     pf.output_plot_data(word, plot_splits_out, 'plot_splits', DATE, bucket, client)
     
     # Rolling
-    windows = [geo.ONE_MONTH, geo.THREE_MONTHS, geo.SIX_MONTHS, geo.ONE_YEAR]
-    for window in windows:
-        plot_rolling_out = geo.plot_rolling_splits(word, window=window, plot=False)
+    # Proportions for all dashboard windows are computed once per split and reused
+    for window in geo.dashboard_windows:
+        plot_rolling_out = geo.plot_rolling_splits(word, window=window, plot=False, compact=COMPACT_FIGURES)
         pf.output_plot_data(word, plot_rolling_out, 'plot_rolling_splits_{}'.format(window), DATE, bucket, client)
     
     # Cumulative
-    plot_cumulative_out = geo.plot_cumulative_splits(word, plot=False)
+    plot_cumulative_out = geo.plot_cumulative_splits(word, plot=False, compact=COMPACT_FIGURES)
     pf.output_plot_data(word, plot_cumulative_out, 'plot_cumulative_splits', DATE, bucket, client)
 
+# Choropleth (does subset_df at a time, against the all-projects state_baseline)
+def build_choropleth(word, subset_df):
+    state_table, region_table = g.state_region_tables(subset_df, state_baseline, trend_finder.current_start)
+    pf.output_table_data(word, state_table, "state_shares", DATE, bucket, client, index=True)
+    pf.output_table_data(word, region_table, "region_shares", DATE, bucket, client, index=True)
+
 
 # Detect trends
 # Read in resources
@@ -229,27 +249,36 @@ projects = project_formatter("/shared-files/csv/new_project_info.csv")
 # Co-occurrences
 # Find co-occurrences
 co_occurrences_dict = {}
+# Counted for all words at once
+all_co_occurrences = trend_finder.find_co_occurrences_many(trend_keywords)
 
 for word in trend_keywords:
-    co_occurrences_dict[word] = pd.DataFrame(trend_finder.find_co_occurrences(word), columns = ["Word", "Count"])
+    co_occurrences_dict[word] = pd.DataFrame(all_co_occurrences[word], columns = ["Word", "Count"])
     pf.output_table_data(word, co_occurrences_dict[word], "co_occurrences", DATE, bucket, client, index=True)
 
 # Plot XoX
-# Overall trend history
+# Overall trend history (all words at once)
+plot_xox_all = trend_finder.plot_xox_many(trend_keywords)
 for word in trend_keywords:
-    plot_xox_out = trend_finder.plot_xox(word, plot = False)
-    pf.output_plot_data(word, plot_xox_out, 'plot_xox', DATE, bucket, client)
+    pf.output_plot_data(word, plot_xox_all[word], 'plot_xox', DATE, bucket, client)
 
 # Demo
 build_demo()
 
+# Choropleth baseline and the (simplified, pre-projected) state outlines to draw it on
+state_baseline = g.window_state_counts(projects, trend_finder.current_start)
+pf.output_json_data(get_state_geometry(), "state_geometry.json", DATE, bucket, client)
+
 # Overview/Geo
+# Which projects each word is in, as a sparse (project x word) matrix
+keyword_matrix = keyword_matrix_from_ids(projects["Project ID"], keyword_ids_dict)
+# Overview (monthly counts of all words in one pass)
+build_overviews(ot.overview_cube(projects, keyword_matrix))
 for word in trend_keywords:
     # Get subset of projects for word
-    subset_df = subset_df_by_id(projects, keyword_ids_dict[word])
-    # Overview
-    build_overview(word, subset_df)
+    subset_df = projects.iloc[keyword_matrix.rows(word)]
     # Geo
     build_geo(word, subset_df)
+    build_choropleth(word, subset_df)
 
 print("TrendFinder done!")
\ No newline at end of file
@@ -0,0 +1,34 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# lib is imported from the TrendFinder directory, as main.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def projects():
+    """Small random projects frame with the fields the Correlator uses, sorted by date."""
+    rng = np.random.RandomState(0)
+    n = 3000
+    days = pd.date_range('2009-01-01', '2012-06-17', freq='D')
+    df = pd.DataFrame({
+        'Project ID': ['p{}'.format(i) for i in range(n)],
+        'Project Posted Date': rng.choice(days, n),
+        'Project Grade Level': rng.choice(['Grades PreK-2', 'Grades 3-5', 'Grades 6-8', 'Grades 9-12'], n),
+        'School Metro Area': rng.choice(['urban', 'suburban', 'rural'], n),
+        'Project Subject': rng.choice(['Math', 'Literacy', 'Science'], n),
+        'Project Subject Category': rng.choice(['A', 'B', 'C'], n),
+        'School Poverty Level': rng.choice(['low income', 'upper income'], n),
+    })
+    for school_type in ['Charter', 'KIPP', 'NLNS', 'Magnet', 'Year Round']:
+        df['School Is {} (Yes / No)'.format(school_type)] = rng.choice(['Yes', 'No'], n)
+    return df.sort_values('Project Posted Date').reset_index(drop=True)
+
+@pytest.fixture
+def keywords_dict(projects):
+    rng = np.random.RandomState(1)
+    return {'k{}'.format(i): list(rng.choice(projects['Project ID'], 200 + 50 * i, replace=False))
+            for i in range(3)}
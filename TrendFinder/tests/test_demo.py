@@ -0,0 +1,25 @@
+import numpy as np
+
+from lib import demo
+from lib.feature_store import FeatureStore
+
+def test_store_periods_when_projects_start_after_store(projects, keywords_dict):
+    store = FeatureStore()
+    store.update(projects)
+    later = projects[projects['Project Posted Date'] >= '2010-03-15']
+    cor = demo.Correlator(later, store=store)
+    cor.find_trends(keywords_dict=keywords_dict)
+    reference = demo.Correlator(later)
+    reference.find_trends(keywords_dict=keywords_dict)
+    keywords = list(keywords_dict)
+
+    for prop in [False, True]:
+        grouped = cor.get_categorical_trends(keywords, prop=prop)
+        assert grouped.index.equals(store.index)
+        expected = reference.get_categorical_trends(keywords, prop=prop)
+        assert np.allclose(grouped.loc[expected.index, keywords].values, expected[keywords].values, equal_nan=True)
+        features = store.grouped(prop)
+        assert np.allclose(grouped[features.columns].values, features.values)
+
+    rolling = cor.rolling_trends(keywords, 3, prop=True)
+    assert rolling.index.equals(store.index)
@@ -0,0 +1,23 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from lib.features import FeatureMatrix, keyword_matrix_from_ids
+
+def test_select_missing_column_raises():
+    features = FeatureMatrix(np.eye(3, dtype=np.uint8), ['a', 'b', 'c'])
+    assert features.select(['c', 'a']).to_frame().values.tolist() == [[0, 1], [0, 0], [1, 0]]
+    with pytest.raises(KeyError):
+        features.select(['a', 'misspelled'])
+
+def test_reindex_missing_column_is_zero():
+    features = FeatureMatrix(np.eye(3, dtype=np.uint8), ['a', 'b', 'c'])
+    assert features.reindex(['c', 'missing']).to_frame().values.tolist() == [[0, 0], [0, 0], [1, 0]]
+
+def test_keyword_matrix_from_ids_matches_isin():
+    index = pd.Series(['p1', 'p2', 'p3', 'p2', 'p4'])
+    keywords_dict = {'slime': ['p2', 'p4', 'p9', 'p4'], 'fidget': [], 'wiggle': ['p1', 'p3']}
+    keywords = keyword_matrix_from_ids(index, keywords_dict)
+    for kw, ids in keywords_dict.items():
+        assert np.array_equal(keywords.column(kw), index.isin(ids).values.astype(np.uint8))
+    assert list(keywords.rows('slime')) == [1, 3, 4]
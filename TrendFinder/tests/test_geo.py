@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+
+from lib import geo as g
+from lib.geo_data.reference import get_counties
+
+def test_projects_without_posted_date_are_left_out(projects):
+    counties = get_counties()['Geography'].iloc[:20].str.split(', ', expand=True)
+    rng = np.random.RandomState(2)
+    picks = rng.randint(0, len(counties), len(projects))
+    projects = projects.assign(**{
+        'School County': counties[0].str.replace(' County', '').values[picks],
+        'School State': counties[1].values[picks],
+        # a few projects without a date, earlier and later than the rest
+        'Project Posted Date': projects['Project Posted Date'].where(projects.index % 50 > 0),
+    })
+    splitter = g.GeoSplitter(projects)
+    daily = splitter.get_daily_split_df(['urban'], 'School Metro Area', 'urban')
+
+    dated = projects[projects['Project Posted Date'].notnull()]
+    expected = dated.groupby([pd.Grouper(key='Project Posted Date', freq='D'),
+                              dated['School Metro Area'] == 'urban']).size().unstack(fill_value=0)
+    expected = expected.reindex(daily.index, fill_value=0)
+    assert daily.index[0] == dated['Project Posted Date'].min()
+    assert np.array_equal(daily['in_urban'].values, expected[True].values)
+    assert np.array_equal(daily['not_urban'].values, expected[False].values)
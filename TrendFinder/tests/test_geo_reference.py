@@ -0,0 +1,27 @@
+import os
+import shutil
+
+from lib.geo_data import reference
+
+def test_counties_cache_is_rebuilt_when_csv_changes(tmp_path, monkeypatch):
+    csv_path = str(tmp_path / 'counties.csv')
+    shutil.copy(reference.COUNTIES_CSV_PATH, csv_path)
+    monkeypatch.setattr(reference, 'COUNTIES_CSV_PATH', csv_path)
+    monkeypatch.setattr(reference, 'COUNTIES_CACHE_PATH', str(tmp_path / 'counties.pkl'))
+    reference.get_counties.cache_clear()
+    counties = reference.get_counties()
+    assert os.path.exists(str(tmp_path / 'counties.pkl'))
+
+    # drop the last county from the source
+    with open(csv_path, 'rb') as f:
+        lines = f.readlines()
+    with open(csv_path, 'wb') as f:
+        f.writelines(lines[:-1])
+    reference.get_counties.cache_clear()
+    assert len(reference.get_counties()) == len(counties) - 1
+    reference.get_counties.cache_clear()
+
+def test_counties_by_state():
+    by_state = reference.get_counties_by_state()
+    assert all(by_state.values())
+    assert sum(len(names) for names in by_state.values()) == len(reference.get_counties())
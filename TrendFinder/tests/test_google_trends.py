@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+
+from lib import demo
+from lib import google_trends as gt
+
+DATES = pd.date_range('2014-01-01', periods=24, freq='MS')
+
+def interest(peaks):
+    """Fixture frame of a seasonal series per keyword, peaking at peaks[keyword]."""
+    season = 1 + np.sin(np.arange(len(DATES)) / 2.0)
+    return pd.DataFrame({kw: season * peak for kw, peak in peaks.items()}, index=DATES)
+
+class FakeClient(object):
+    """pytrends stand-in: scales each payload to its largest keyword, in integers, as Google does."""
+    def __init__(self, fixture):
+        self.fixture = fixture
+        self.payloads = []
+
+    def build_payload(self, kw_list, **kwargs):
+        self.payloads.append(list(kw_list))
+
+    def interest_over_time(self):
+        trends = gt.FixtureProvider(self.fixture).interest_over_time(self.payloads[-1])
+        if trends.empty:
+            return pd.DataFrame()
+        trends = (trends * 100 / trends.values.max()).round()
+        trends['isPartial'] = False
+        return trends
+
+def pytrends_provider(fixture):
+    provider = gt.PytrendsProvider(pause=0)
+    provider.client = FakeClient(fixture)
+    return provider
+
+def test_fixture_provider_leaves_out_keywords_without_data():
+    provider = gt.FixtureProvider(interest({'slime': 50, 'fidget': 10}))
+    trends = provider.interest_over_time(['fidget', 'unknown'])
+    assert list(trends.columns) == ['fidget']
+
+def test_fixture_provider_reads_csv(tmp_path):
+    path = str(tmp_path / 'trends.csv')
+    interest({'slime': 50}).to_csv(path)
+    trends = gt.FixtureProvider(path).interest_over_time(['slime'])
+    assert trends.index.equals(DATES)
+    assert np.allclose(trends['slime'], interest({'slime': 50})['slime'])
+
+def test_pytrends_provider_requests_swamped_keywords_alone():
+    provider = pytrends_provider(interest({'slime': 5000, 'fidget': 40, 'wiggle': 1, 'flexible': 3000}))
+    trends = provider.interest_over_time(['slime', 'fidget', 'wiggle', 'flexible', 'unknown'])
+    assert provider.client.payloads[0] == ['slime', 'fidget', 'wiggle', 'flexible', 'unknown']
+    assert sorted(map(tuple, provider.client.payloads[1:])) == [('fidget',), ('unknown',), ('wiggle',)]
+    # every keyword with data at full resolution, scaled to its own maximum
+    assert sorted(trends.columns) == ['fidget', 'flexible', 'slime', 'wiggle']
+    assert np.allclose(trends.max(), 100)
+    assert trends['wiggle'].nunique() == trends['slime'].nunique()
+
+def test_pytrends_provider_batches_comparable_keywords():
+    provider = pytrends_provider(interest({'k{}'.format(i): 100 + i for i in range(7)}))
+    trends = provider.interest_over_time(['k{}'.format(i) for i in range(7)])
+    assert [len(payload) for payload in provider.client.payloads] == [5, 2]
+    assert trends.shape == (len(DATES), 7)
+
+def test_cached_provider_keeps_results(tmp_path):
+    fixture = interest({'slime': 50, 'fidget': 10})
+    provider = gt.CachedProvider(gt.FixtureProvider(fixture), str(tmp_path))
+    first = provider.interest_over_time(['slime', 'fidget'])
+    # served from the cache even once the source no longer has them
+    provider.provider = gt.FixtureProvider(fixture.iloc[:, :0])
+    pd.testing.assert_frame_equal(provider.interest_over_time(['slime', 'fidget']), first)
+
+def test_cached_provider_does_not_cache_missing_keywords(tmp_path):
+    provider = gt.CachedProvider(gt.FixtureProvider(interest({'slime': 50})), str(tmp_path))
+    assert list(provider.interest_over_time(['slime', 'fidget']).columns) == ['slime']
+    provider.provider = gt.FixtureProvider(interest({'slime': 50, 'fidget': 10}))
+    assert list(provider.interest_over_time(['slime', 'fidget']).columns) == ['slime', 'fidget']
+
+def test_cached_provider_refetches_stale_results(tmp_path):
+    provider = gt.CachedProvider(gt.FixtureProvider(interest({'slime': 50})), str(tmp_path), max_age=0)
+    provider.interest_over_time(['slime'])
+    provider.provider = gt.FixtureProvider(interest({'slime': 80}))
+    assert np.allclose(provider.interest_over_time(['slime'])['slime'], interest({'slime': 80})['slime'])
+
+def test_ggl_trends_all_from_fixture():
+    grouped = pd.DataFrame({'slime': np.arange(12)}, index=pd.date_range('2014-06-30', periods=12, freq='M'))
+    all_trends = demo.ggl_trends_all(grouped, ['slime', 'unknown'], gt.FixtureProvider(interest({'slime': 50})))
+    assert all_trends['unknown'].empty
+    assert list(all_trends['slime'].columns) == ['slime', 'Google Trends']
+    assert all_trends['slime'].index.equals(grouped.index)
@@ -0,0 +1,19 @@
+import pandas as pd
+
+from lib import overview_traces as ot
+from lib.features import keyword_matrix_from_ids
+from lib.helpers import subset_df_by_id
+
+def test_overview_cube_with_repeated_project_ids(projects, keywords_dict):
+    projects = projects.assign(**{'School Metro Area': projects['School Metro Area'].where(projects.index % 7 > 0)})
+    # a project listed twice, as a join upstream can leave it
+    repeated = pd.concat([projects, projects.iloc[[10, 20]]]).sort_values('Project Posted Date')
+    keywords_dict = dict(keywords_dict, k0=keywords_dict['k0'] + list(projects['Project ID'].iloc[[10, 20]]))
+    keywords = keyword_matrix_from_ids(repeated['Project ID'], keywords_dict)
+    cube = ot.overview_cube(repeated, keywords)
+    for kw, ids in keywords_dict.items():
+        subset = subset_df_by_id(repeated, ids)
+        assert repeated.iloc[keywords.rows(kw)].equals(subset)
+        expected = ot.overview_counts(subset)
+        for column, table in expected.items():
+            pd.testing.assert_frame_equal(cube[kw][column], table)
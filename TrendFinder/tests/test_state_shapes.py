@@ -0,0 +1,24 @@
+import numpy as np
+
+from lib.geo_data import state_shapes as ss
+
+def square(x0, y0, size, clockwise=True):
+    ring = np.array([[x0, y0], [x0 + size, y0], [x0 + size, y0 + size], [x0, y0 + size], [x0, y0]], dtype=float)
+    return ring[::-1] if clockwise else ring
+
+def test_holes_stay_with_their_outer_ring():
+    big, small = square(0, 0, 10), square(20, 0, 5)
+    hole = square(2, 2, 3, clockwise=False)
+    polygons = ss.group_rings([big, small, hole])
+    assert len(polygons) == 2
+    assert np.array_equal(polygons[0][0], big) and np.array_equal(polygons[0][1], hole)
+    assert len(polygons[1]) == 1
+
+def test_state_geometry_polygons():
+    geometry = ss.build_state_geometry(path=None)
+    for feature in geometry['features']:
+        for polygon in feature['geometry']['coordinates']:
+            outer = np.array(polygon[0])
+            assert ss.ring_area(outer) <= 0
+            for hole in polygon[1:]:
+                assert ss.contains(outer, hole[0])
@@ -0,0 +1,15 @@
+import numpy as np
+import pandas as pd
+
+from lib import stationarity
+
+def test_serial_by_default(monkeypatch):
+    def no_pool(*args, **kwargs):
+        raise AssertionError('a process pool was started')
+    monkeypatch.setattr(stationarity, 'ProcessPoolExecutor', no_pool)
+    rng = np.random.RandomState(0)
+    frame = pd.DataFrame(rng.normal(size=(60, stationarity.MIN_PARALLEL_COLUMNS * 2)))
+    stationarity.clear_cache()
+    table = stationarity.stationarity_table(frame)
+    assert list(table.index) == list(frame.columns)
+    assert table['Passed'].all()
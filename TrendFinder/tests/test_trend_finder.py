@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from lib import TrendFinder as tf
+
+@pytest.fixture
+def resources(monkeypatch):
+    """Random resources over three years, 'fidget' taking off in the last month."""
+    # nltk's corpus isn't needed to test the filtering itself
+    monkeypatch.setattr(tf, 'get_stoplist', lambda: frozenset(['the', 'and', 'nan']))
+    rng = np.random.RandomState(0)
+    n = 5000
+    words = np.array(['w{}'.format(i) for i in range(200)] + ['the', 'and', '123', 'x'])
+    dates = pd.Timestamp('2015-01-01') + pd.to_timedelta(np.sort(rng.randint(0, 3 * 365, n)), unit='D')
+    docs = [list(rng.choice(words, rng.randint(1, 8))) for _ in range(n)]
+    for i in range(n - 150, n):
+        docs[i].append('fidget')
+    return pd.DataFrame({'Project ID': ['p{}'.format(i) for i in range(n)],
+                         'Project Posted Date': dates, 'Cleaned Item Name': docs})
+
+def test_find_historical_trends_on_a_new_object(resources):
+    trend_finder = tf.TrendFinder(resources)
+    trends = trend_finder.find_historical_trends(exclude=['w0'])
+    assert list(trends.columns) == ['word', 'prop_range']
+    assert trends['word'].iloc[0] == 'fidget'
+    assert not set(trends['word']) & {'the', 'and', '123', 'x', 'w0'}
+
+def test_find_current_trends_on_a_new_object(resources):
+    trend_finder = tf.TrendFinder(resources)
+    trends = trend_finder.find_current_trends(top_k=3)
+    assert list(trends['Rank']) == [1, 2, 3][:len(trends)]
+    assert trends['word'].iloc[0] == 'fidget'